@@ -0,0 +1,252 @@
+"""
+The NotP array type and the builtin functions that work on it.
+
+An Array keeps integers in a compact array('q') buffer. Anything else
+(strings, nested arrays, integers beyond 64 bits) is kept in a Python
+list instead. True and False are stored as 1 and 0.
+
+Arithmetic and comparison operators apply element-wise to two arrays of
+the same length, or to an array and a single value. Each one is a single
+operation for whichever engine runs it. The loop over the elements runs in C:
+in NumPy when it is installed and the result is certain to fit in 64
+bits, and through map() over the buffer otherwise. Element-wise
+comparisons give 1 or 0 per element, so sum(a > 10) counts matches.
+Arrays have no truth value; 'if (a == b)' raises TypeError.
+
+The functions at the end of this module are the array builtins (len,
+sum, min, max and fill). stdlib.py registers them.
+"""
+
+import operator
+from array import array
+from itertools import repeat
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+INT64_MAX = (1 << 63) - 1
+
+# Smaller arrays are not worth converting to NumPy and back
+NUMPY_MIN_SIZE = 64
+
+
+def _store(values):
+    """Returns an array('q') holding 'values', or a list if they do not all fit."""
+    if type(values) not in (list, tuple, array):
+        # array() consumes an iterator before it fails; keep the values for the fallback
+        values = list(values)
+    try:
+        return array("q", values)
+    except (TypeError, OverflowError):
+        return list(values)
+
+
+def _wrap(data):
+    result = Array.__new__(Array)
+    result.data = data
+    return result
+
+
+def _magnitude(data):
+    """Largest absolute value in an int64 NumPy array, as a Python int."""
+    return max(abs(int(data.max())), abs(int(data.min())))
+
+
+def _numpy_operands(left, right):
+    """Returns (a, b, magnitude_a, magnitude_b) as NumPy operands, or None if NumPy should not be used."""
+    operands = []
+    for value in (left, right):
+        if type(value) is Array:
+            if type(value.data) is not array or len(value.data) < NUMPY_MIN_SIZE:
+                return None
+            data = numpy.frombuffer(value.data, dtype=numpy.int64)
+            operands.append((data, _magnitude(data)))
+        elif type(value) is int and abs(value) <= INT64_MAX:
+            operands.append((value, abs(value)))
+        else:
+            return None
+    (a, magnitude_a), (b, magnitude_b) = operands
+    return a, b, magnitude_a, magnitude_b
+
+
+def _numpy_elementwise(op, left, right):
+    """Computes 'op' with NumPy when the result cannot overflow; returns None otherwise."""
+    operands = _numpy_operands(left, right)
+    if operands is None:
+        return None
+    a, b, magnitude_a, magnitude_b = operands
+    if op in COMPARISONS:
+        result = NUMPY_OPERATORS[op](a, b).astype(numpy.int64)
+    elif op is operator.mul:
+        if magnitude_a * magnitude_b > INT64_MAX:
+            return None
+        result = a * b
+    elif op is operator.floordiv:
+        if magnitude_a > INT64_MAX or not numpy.all(b):
+            # INT64_MIN // -1 overflows; division by zero goes through Python for its ZeroDivisionError.
+            return None
+        result = a // b
+    elif op in (operator.add, operator.sub):
+        if magnitude_a + magnitude_b > INT64_MAX:
+            return None
+        result = NUMPY_OPERATORS[op](a, b)
+    else:
+        return None
+    data = array("q")
+    data.frombytes(numpy.ascontiguousarray(result, dtype=numpy.int64).tobytes())
+    return _wrap(data)
+
+
+def _operands(left, right):
+    """Returns fresh iterables of the left and right elements, repeating a single value."""
+    if type(left) is Array and type(right) is Array:
+        if len(left.data) != len(right.data):
+            raise ValueError(f"arrays have different lengths: {len(left.data)} and {len(right.data)}")
+        return left.data, right.data
+    if type(left) is Array:
+        return left.data, repeat(right, len(left.data))
+    return repeat(left, len(right.data)), right.data
+
+
+def elementwise(op, left, right):
+    """Applies the binary operator 'op' element by element; at least one side is an Array."""
+    if numpy is not None:
+        result = _numpy_elementwise(op, left, right)
+        if result is not None:
+            return result
+    try:
+        return _wrap(array("q", map(op, *_operands(left, right))))
+    except (TypeError, OverflowError):
+        # Strings, nested arrays or big integers: run it again into a list, which also re-raises real errors
+        return _wrap(list(map(op, *_operands(left, right))))
+
+
+class Array:
+    """A mutable NotP array. See the module docstring for how it is stored."""
+    __slots__ = ("data",)
+    # Mutable, so unusable as a dict key (and never cached by memoization.py)
+    __hash__ = None
+
+    def __init__(self, values=()):
+        self.data = _store(values)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __getitem__(self, index):
+        try:
+            return self.data[index]
+        except IndexError:
+            raise IndexError(f"array index {index} out of range for length {len(self.data)}") from None
+
+    def __setitem__(self, index, value):
+        data = self.data
+        try:
+            data[index] = value
+        except IndexError:
+            raise IndexError(f"array index {index} out of range for length {len(data)}") from None
+        except (TypeError, OverflowError):
+            if type(data) is not array or type(index) is not int:
+                raise
+            # The value does not fit in the buffer: fall back to a list
+            self.data = data = list(data)
+            data[index] = value
+
+    def __bool__(self):
+        raise TypeError("the truth value of an array is ambiguous; compare len(a) instead")
+
+    def __str__(self):
+        return "[" + ", ".join(map(str, self.data)) + "]"
+
+    def __repr__(self):
+        return f"Array({list(self.data)!r})"
+
+    # Element-wise operators. There are deliberately no in-place forms
+    # (__iadd__ ...), so 'x = x + 1' never modifies an array another name refers to.
+    def __add__(self, other): return elementwise(operator.add, self, other)
+    def __radd__(self, other): return elementwise(operator.add, other, self)
+    def __sub__(self, other): return elementwise(operator.sub, self, other)
+    def __rsub__(self, other): return elementwise(operator.sub, other, self)
+    def __mul__(self, other): return elementwise(operator.mul, self, other)
+    def __rmul__(self, other): return elementwise(operator.mul, other, self)
+    def __floordiv__(self, other): return elementwise(operator.floordiv, self, other)
+    def __rfloordiv__(self, other): return elementwise(operator.floordiv, other, self)
+    # A reflected comparison (5 < a) arrives here as a > 5, so these cover both sides.
+    def __eq__(self, other): return elementwise(operator.eq, self, other)
+    def __ne__(self, other): return elementwise(operator.ne, self, other)
+    def __lt__(self, other): return elementwise(operator.lt, self, other)
+    def __gt__(self, other): return elementwise(operator.gt, self, other)
+    def __le__(self, other): return elementwise(operator.le, self, other)
+    def __ge__(self, other): return elementwise(operator.ge, self, other)
+
+
+COMPARISONS = {operator.eq, operator.ne, operator.lt, operator.gt, operator.le, operator.ge}
+
+if numpy is not None:
+    NUMPY_OPERATORS = {
+        operator.add: numpy.add, operator.sub: numpy.subtract,
+        operator.eq: numpy.equal, operator.ne: numpy.not_equal, operator.lt: numpy.less,
+        operator.gt: numpy.greater, operator.le: numpy.less_equal, operator.ge: numpy.greater_equal,
+    }
+
+
+def _elements(value, name):
+    if type(value) is not Array:
+        raise TypeError(f"{name}() expects an array")
+    return value.data
+
+
+def length(value):
+    """len(a): the number of elements of an array, or characters of a string."""
+    return len(value)
+
+
+def total(values):
+    """sum(a): the sum of the elements."""
+    return sum(_elements(values, "sum"))
+
+
+def smallest(*values):
+    """min(a): the smallest element. min(x, y, ...): the smallest argument."""
+    if len(values) != 1:
+        return min(values)
+    data = _elements(values[0], "min")
+    if not data:
+        raise ValueError("min() of an empty array")
+    return min(data)
+
+
+def largest(*values):
+    """max(a): the largest element. max(x, y, ...): the largest argument."""
+    if len(values) != 1:
+        return max(values)
+    data = _elements(values[0], "max")
+    if not data:
+        raise ValueError("max() of an empty array")
+    return max(data)
+
+
+def _copy(value):
+    """Returns 'value' with every array in it copied, however deeply nested."""
+    if type(value) is not Array:
+        return value
+    if type(value.data) is array:
+        return _wrap(value.data[:])
+    return _wrap([_copy(element) for element in value.data])
+
+
+def fill(count, value):
+    """fill(n, v): a new array of n elements, each v. Arrays in v are copied at every depth, never shared."""
+    if type(count) is not int or count < 0:
+        raise ValueError("fill() needs a non-negative count")
+    if type(value) is Array:
+        return _wrap([_copy(value) for _ in range(count)])
+    try:
+        return _wrap(array("q", [value]) * count)
+    except (TypeError, OverflowError):
+        return _wrap([value] * count)
@@ -0,0 +1,116 @@
+"""
+Runs many independent NotP jobs across a pool of worker processes.
+
+A job is a script plus the global bindings for one run (see runtime.py).
+Every distinct script is compiled once, in the parent. The compiled
+Programs are handed to each worker once, when the worker starts, and jobs
+are then sent in chunks that carry only an index into that table.
+Results come back in job order, each with its output, its error (if any)
+and how long it ran.
+
+A manifest is a JSON Lines file with one job per line:
+
+    {"script": "rules/discount.notp", "inputs": {"price": 120}}
+
+Relative script paths are resolved against the manifest's directory.
+
+With limits.Limits, every job is metered; a job that exceeds them fails
+with a LimitExceeded error and the batch goes on.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from runtime import Program
+
+
+class JobResult:
+    """Outcome of one job."""
+    __slots__ = ("script", "inputs", "output", "error", "seconds")
+
+    def __init__(self, script, inputs, output, error, seconds):
+        self.script = script
+        self.inputs = inputs
+        self.output = output
+        # "ExceptionType: message", or None when the job succeeded
+        self.error = error
+        self.seconds = seconds
+
+
+# Set in each worker by _init_worker(): compiled programs, the job list and the limits
+_programs = None
+_jobs = None
+_limits = None
+
+
+def _init_worker(programs, jobs, limits=None):
+    global _programs, _jobs, _limits
+    _programs = programs
+    _jobs = jobs
+    _limits = limits
+
+
+def _run_job(index):
+    """Runs job 'index' in this worker; returns (output, error, seconds)."""
+    script, inputs = _jobs[index]
+    program = _programs[script]
+    if isinstance(program, str):
+        # The script failed to compile
+        return "", program, 0.0
+    start = time.perf_counter()
+    try:
+        result = program.run(inputs, _limits)
+    except Exception as error:
+        return "", f"{type(error).__name__}: {error}", time.perf_counter() - start
+    return result.output, None, time.perf_counter() - start
+
+
+def read_manifest(path):
+    """Returns the (script, inputs) pairs listed in a JSON Lines manifest."""
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "script" not in entry:
+                raise ValueError(f"{path}:{line_number}: job has no 'script'")
+            jobs.append((os.path.join(base, entry["script"]), entry.get("inputs") or {}))
+    return jobs
+
+
+def compile_scripts(scripts, optimize=False):
+    """Returns {script: Program}, or {script: error text} for scripts that fail to compile."""
+    programs = {}
+    for script in scripts:
+        if script in programs:
+            continue
+        try:
+            programs[script] = Program.from_file(script, optimize=optimize)
+        except Exception as error:
+            programs[script] = f"{type(error).__name__}: {error}"
+    return programs
+
+
+def run_batch(jobs, workers=None, chunksize=None, optimize=False, limits=None):
+    """
+    Runs (script, inputs) jobs on 'workers' processes (default: one per CPU)
+    and returns a JobResult per job, in the same order. 'limits' meters every job.
+    """
+    jobs = list(jobs)
+    programs = compile_scripts((script for script, _ in jobs), optimize)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        _init_worker(programs, jobs, limits)
+        outcomes = map(_run_job, range(len(jobs)))
+        return [JobResult(script, inputs, *outcome) for (script, inputs), outcome in zip(jobs, outcomes)]
+
+    if chunksize is None:
+        # A few chunks per worker keeps the load balanced without paying IPC per job
+        chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(programs, jobs, limits)) as pool:
+        outcomes = list(pool.map(_run_job, range(len(jobs)), chunksize=chunksize))
+    return [JobResult(script, inputs, *outcome) for (script, inputs), outcome in zip(jobs, outcomes)]
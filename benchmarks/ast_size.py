@@ -0,0 +1,105 @@
+"""
+Parse-time and AST-memory benchmark on a large generated program.
+
+Generates a synthetic NotP script (many functions with arithmetic,
+branches, loops and calls, then top-level calls), parses it, and reports:
+  - source size and parse time (best of --repeat)
+  - bytes of the AST, traced while it is built, and per source byte
+  - node tuples and distinct identifier strings in the AST
+
+The AST is made of tuples with string kinds. What reduces its size is leaf
+sharing (interned identifiers and one tuple per distinct variable, number
+or string literal), so the tuple and string counts are the figures to watch.
+
+    python benchmarks/ast_size.py
+    python benchmarks/ast_size.py --functions 5000 --save big.notp
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexer import tokenize
+from parser import Parser
+
+
+def generate(functions, seed=1):
+    """Returns the source of a synthetic program with 'functions' functions."""
+    rng = random.Random(seed)
+    names = [f"var_{i}" for i in range(200)]
+    lines = []
+    for index in range(functions):
+        lines.append(f"func fn_{index}(a, b) {{")
+        for _ in range(10):
+            name = rng.choice(names)
+            lines.append(f"  {name} = a * {rng.randint(0, 1000)} + b - {rng.choice(names)} / 3")
+            lines.append(f"  if ({name} > {rng.randint(0, 99)}) {{ print({name} + a) }}")
+        lines.append("  i = 0")
+        lines.append("  while (i < 10) { b = b + fn_0(i, a) i = i + 1 }")
+        lines.append("  return a + b")
+        lines.append("}")
+    for _ in range(functions * 5 // 2):
+        lines.append(f"{rng.choice(names)} = fn_{rng.randrange(functions)}({rng.randint(0, 9)}, {rng.choice(names)})")
+    return "\n".join(lines) + "\n"
+
+
+def count(ast):
+    """Returns (distinct node tuples, distinct identifier strings) reachable from 'ast'."""
+    nodes, names = set(), set()
+    todo = [ast]
+    while todo:
+        item = todo.pop()
+        if isinstance(item, list):
+            todo.extend(item)
+        elif isinstance(item, tuple) and id(item) not in nodes:
+            nodes.add(id(item))
+            if item[0] in ("variable", "assign", "call", "function"):
+                names.add(id(item[1]))
+            todo.extend(item[1:])
+    return len(nodes), len(names)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Measure parse time and AST memory.")
+    arg_parser.add_argument("--functions", type=int, default=2000, help="functions in the program (default: 2000)")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="timed parses, best one counts (default: 3)")
+    arg_parser.add_argument("--save", metavar="FILE", help="also write the generated program to FILE")
+    args = arg_parser.parse_args()
+
+    source = generate(args.functions)
+    if args.save:
+        with open(args.save, "w") as f:
+            f.write(source)
+
+    best = float("inf")
+    for _ in range(args.repeat):
+        gc.collect()
+        start = time.perf_counter()
+        Parser(tokenize(source)).parse()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        ast = Parser(tokenize(source)).parse()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    nodes, names = count(ast)
+
+    print(f"source:          {len(source) / 1e6:8.2f} MB")
+    print(f"parse time:      {best * 1000:8.0f} ms")
+    print(f"AST size:        {size / 1e6:8.2f} MB ({size / len(source):.1f} bytes per source byte)")
+    print(f"node tuples:     {nodes:8d}")
+    print(f"name strings:    {names:8d}")
+
+
+if __name__ == "__main__":
+    main()
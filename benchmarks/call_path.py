@@ -0,0 +1,123 @@
+"""
+Microbenchmark for the VM call path.
+
+Reports, for a small two-argument function:
+  - time per call, with the cost of the surrounding loop subtracted
+  - Frame objects allocated per call (the free list makes this close to 0)
+  - traced bytes per active call during a deep non-tail recursion
+
+    python benchmarks/call_path.py
+    python benchmarks/call_path.py --calls 500000 --depth 20000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import compiler as compiler_module
+from lexer import tokenize
+from parser import Parser
+from compiler import Compiler
+
+CALL_LOOP = """
+func add(a, b) {
+  return a + b
+}
+acc = 0
+i = 0
+while (i < %d) {
+  acc = add(acc, i)
+  i = i + 1
+}
+print(acc)
+"""
+
+INLINE_LOOP = """
+acc = 0
+i = 0
+while (i < %d) {
+  acc = acc + i
+  i = i + 1
+}
+print(acc)
+"""
+
+RECURSION = """
+func down(n) {
+  if (n == 0) {
+    return 0
+  }
+  return down(n - 1) + 1
+}
+print(down(%d))
+"""
+
+
+class CountingFrame(compiler_module.Frame):
+    """Frame that counts its constructions."""
+    __slots__ = ()
+    created = 0
+
+    def __init__(self):
+        CountingFrame.created += 1
+        super().__init__()
+
+
+def prepare(source):
+    compiler = Compiler()
+    compiler.compile(Parser(tokenize(source)).parse())
+    compiler.assemble()
+    return compiler
+
+
+def timed_run(compiler, repeat):
+    """Returns the fastest of 'repeat' runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            compiler.run()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Measure the cost of a VM call.")
+    arg_parser.add_argument("--calls", type=int, default=200000, help="calls in the timed loop (default: 200000)")
+    arg_parser.add_argument("--depth", type=int, default=10000, help="depth of the recursion (default: 10000)")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="timed runs, best one counts (default: 5)")
+    args = arg_parser.parse_args()
+
+    with_calls = timed_run(prepare(CALL_LOOP % args.calls), args.repeat)
+    inline = timed_run(prepare(INLINE_LOOP % args.calls), args.repeat)
+    per_call = (with_calls - inline) / args.calls
+    print(f"time per call:        {per_call * 1e9:8.1f} ns")
+
+    original, compiler_module.Frame = compiler_module.Frame, CountingFrame
+    try:
+        CountingFrame.created = 0
+        timed_run(prepare(CALL_LOOP % args.calls), 1)
+        print(f"frames per call:      {CountingFrame.created / args.calls:8.4f}")
+    finally:
+        compiler_module.Frame = original
+
+    recursion = prepare(RECURSION % args.depth)
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            recursion.run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    print(f"bytes per active call: {peak / args.depth:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
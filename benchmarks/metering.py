@@ -0,0 +1,83 @@
+"""
+Overhead of execution limits (see limits.py).
+
+Runs every benchmarks/*.notp program on the VM, and optionally on the tree
+interpreter, without limits and under limits that are set but never reached.
+Reports the best time of each and the metered overhead.
+
+    python benchmarks/metering.py
+    python benchmarks/metering.py --engines vm interpreter --repeat 5
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexer import tokenize_file
+from parser import Parser
+from compiler import Compiler
+from interpreter import interpret, metered
+from resolver import resolve
+from limits import Limits
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# High enough that no benchmark reaches them, so every check runs and none fires
+GENEROUS = Limits(max_steps=10 ** 12, max_depth=10 ** 6, max_stack=10 ** 6, max_value_size=10 ** 9)
+
+
+def prepare(path, engine):
+    """Returns (unmetered, metered) callables that run the program at 'path'."""
+    ast = Parser(tokenize_file(path)).parse()
+    if engine == "interpreter":
+        resolved = resolve(ast)
+        return lambda: interpret(resolved), lambda: metered(resolved, GENEROUS)
+    compiler = Compiler()
+    compiler.compile(ast)
+    compiler.assemble()
+    return compiler.run, lambda: compiler.run(limits=GENEROUS)
+
+
+def best_time(run, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compare metered and unmetered runs.")
+    arg_parser.add_argument("--engines", nargs="+", choices=("vm", "interpreter"), default=["vm"],
+                            help="engines to measure (default: vm)")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="timed runs, best one counts (default: 3)")
+    arg_parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    args = arg_parser.parse_args()
+
+    print(f"{'benchmark':<20} {'engine':<12} {'plain ms':>10} {'metered ms':>11} {'overhead':>9}")
+    for path in sorted(glob.glob(os.path.join(BENCHMARK_DIR, "*.notp"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if args.filter not in name:
+            continue
+        for engine in args.engines:
+            plain, checked = prepare(path, engine)
+            # Interleave so both see the same machine load
+            plain_time = checked_time = float("inf")
+            for _ in range(args.repeat):
+                plain_time = min(plain_time, best_time(plain, 1))
+                checked_time = min(checked_time, best_time(checked, 1))
+            overhead = (checked_time - plain_time) / plain_time * 100
+            print(f"{name:<20} {engine:<12} {plain_time * 1000:10.1f} {checked_time * 1000:11.1f} {overhead:8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Benchmark runner for the NotP execution engines.
+
+Runs every benchmarks/*.notp program under each engine with warmup and
+repetitions, and reports runs per second, median and p95 wall time, and
+peak traced memory. Results can be saved as JSON and compared against a
+stored baseline; slowdowns beyond the threshold are flagged and make the
+runner exit with status 1.
+
+    python benchmarks/run.py
+    python benchmarks/run.py --engines vm --repeat 10 --save-baseline
+    python benchmarks/run.py --filter fib --threshold 0.05
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexer import tokenize_file
+from parser import Parser
+from compiler import Compiler
+from interpreter import interpret
+from resolver import resolve
+from closure_compiler import compile_closures
+import stack_interpreter
+from optimizer import optimize
+from jit import Jit
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS = os.path.join(BENCHMARK_DIR, "results.json")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+
+def prepare_interpreter(ast):
+    resolved = resolve(ast)
+    return lambda: interpret(resolved)
+
+
+def prepare_stack(ast):
+    resolved = resolve(ast)
+    return lambda: stack_interpreter.run(resolved)
+
+
+def prepare_closures(ast):
+    return compile_closures(ast)
+
+
+def prepare_vm(ast, optimized=False, jit=False):
+    compiler = Compiler()
+    compiler.compile(ast)
+    if optimized:
+        optimize(compiler)
+    compiler.assemble()
+    if jit:
+        # A fresh Jit per run, so every timed run includes its own warm-up and translation
+        return lambda: compiler.run(jit=Jit())
+    return compiler.run
+
+
+# Each engine turns a parsed program into a zero-argument callable.
+# Compilation happens once, outside the timed region.
+ENGINES = {
+    "interpreter": prepare_interpreter,
+    "stack": prepare_stack,
+    "closures": prepare_closures,
+    "vm": prepare_vm,
+    "vm-O": lambda ast: prepare_vm(ast, optimized=True),
+    "vm-jit": lambda ast: prepare_vm(ast, optimized=True, jit=True),
+}
+
+
+def run_captured(program):
+    """Runs a prepared program with stdout captured; returns the output."""
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        program()
+    return buffer.getvalue()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(program, warmup, repeat):
+    """Times 'repeat' runs after 'warmup' untimed ones, then one extra run under tracemalloc."""
+    for _ in range(warmup):
+        run_captured(program)
+    samples = []
+    output = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = run_captured(program)
+        samples.append(time.perf_counter() - start)
+
+    # Tracing slows execution down a lot, so memory gets its own run.
+    tracemalloc.start()
+    try:
+        run_captured(program)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(samples)
+    return {
+        "runs": repeat,
+        "runs_per_sec": 1.0 / median if median else float("inf"),
+        "median_s": median,
+        "p95_s": percentile(samples, 0.95),
+        "min_s": min(samples),
+        "peak_memory_bytes": peak,
+    }, output
+
+
+def run_suite(files, engines, warmup, repeat, log=sys.stderr):
+    results = {}
+    for path in files:
+        name = os.path.splitext(os.path.basename(path))[0]
+        ast = Parser(tokenize_file(path)).parse()
+        results[name] = {}
+        outputs = {}
+        for engine in engines:
+            program = ENGINES[engine](ast)
+            stats, outputs[engine] = measure(program, warmup, repeat)
+            results[name][engine] = stats
+            print(f"  {name:<20} {engine:<12} median {stats['median_s'] * 1000:9.2f} ms  "
+                  f"p95 {stats['p95_s'] * 1000:9.2f} ms  {stats['runs_per_sec']:8.2f} runs/s  "
+                  f"peak {stats['peak_memory_bytes'] / 1024:9.1f} KiB", file=log)
+        if len(set(outputs.values())) > 1:
+            print(f"  WARNING: engines disagree on the output of {name}", file=log)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns (benchmark, engine, baseline median, current median) for every regression."""
+    regressions = []
+    for name, engines in results.items():
+        for engine, stats in engines.items():
+            old = baseline.get(name, {}).get(engine)
+            if old and stats["median_s"] > old["median_s"] * (1 + threshold):
+                regressions.append((name, engine, old["median_s"], stats["median_s"]))
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark NotP engines.")
+    arg_parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=["interpreter", "vm"],
+                            help="engines to measure (default: interpreter vm)")
+    arg_parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+    arg_parser.add_argument("--warmup", type=int, default=1, help="untimed runs before measuring")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark and engine")
+    arg_parser.add_argument("--output", default=DEFAULT_RESULTS, help="where to write the JSON results")
+    arg_parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    arg_parser.add_argument("--save-baseline", action="store_true", help="also store these results as the baseline")
+    arg_parser.add_argument("--threshold", type=float, default=0.10,
+                            help="relative slowdown of the median that counts as a regression (default: 0.10)")
+    args = arg_parser.parse_args()
+
+    files = sorted(path for path in glob.glob(os.path.join(BENCHMARK_DIR, "*.notp"))
+                   if args.filter in os.path.basename(path))
+    results = run_suite(files, args.engines, args.warmup, args.repeat)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "warmup": args.warmup,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    for name, engine, old, new in regressions:
+        print(f"REGRESSION {name} [{engine}]: median {old * 1000:.2f} ms -> {new * 1000:.2f} ms "
+              f"(+{(new / old - 1) * 100:.1f}%)", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Checks the native x86-64 backend against the VM.
+
+Every program is compiled with native_compiler.py, built with gcc and
+run. Its stdout and exit status are compared with those of the same
+program on the VM. Programs outside the native subset are reported as
+skipped. Exits with status 1 if any output differs.
+
+    python bootstrap/check_native.py
+    python bootstrap/check_native.py benchmarks/*.notp
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexer import tokenize_file
+from parser import Parser
+from compiler import Compiler
+from native_compiler import Unsupported, build, compile_native
+
+
+def run_vm(ast):
+    """Returns (stdout, exit status) of the program on the VM."""
+    buffer = io.StringIO()
+    status = 0
+    with contextlib.redirect_stdout(buffer):
+        try:
+            compiler = Compiler()
+            compiler.compile(ast)
+            compiler.run()
+        except Exception:
+            status = 1
+    return buffer.getvalue(), status
+
+
+def run_native(ast, directory, cc):
+    """Returns (stdout, exit status) of the program as a native binary."""
+    binary = os.path.join(directory, "program")
+    build(compile_native(ast), binary, cc)
+    result = subprocess.run([binary], capture_output=True, text=True)
+    return result.stdout, result.returncode
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compare the native backend with the VM.")
+    arg_parser.add_argument("files", nargs="*", help="programs to check (default: examples/*.notp)")
+    arg_parser.add_argument("--cc", default="gcc", help="C compiler used to assemble and link (default: gcc)")
+    args = arg_parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(ROOT, "examples", "*.notp")))
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for path in files:
+            name = os.path.relpath(path, ROOT)
+            ast = Parser(tokenize_file(path)).parse()
+            expected = run_vm(ast)
+            try:
+                actual = run_native(ast, directory, args.cc)
+            except Unsupported as reason:
+                print(f"SKIP {name}: {reason}")
+                continue
+            if actual == expected:
+                print(f"ok   {name}")
+            else:
+                failures += 1
+                print(f"FAIL {name}: VM exited {expected[1]}, native exited {actual[1]}")
+                print(f"  VM:     {expected[0]!r}")
+                print(f"  native: {actual[0]!r}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
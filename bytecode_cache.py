@@ -0,0 +1,135 @@
+"""
+On-disk cache of assembled VM bytecode (.notpc files).
+
+Layout: a fixed header followed by a marshal payload.
+
+    magic      5 bytes   b"NOTPC"
+    version    uint16    FORMAT_VERSION
+    interface  uint32    crc32 of opcodes.OPNAMES and the registered builtins, so
+                         renumbered opcodes or changed builtins invalidate old files
+    flags      uint8     FLAG_OPTIMIZED when the bytecode went through optimizer.py
+    source     32 bytes  sha256 of the source file
+
+The payload holds the constant pool, the name table, the main code and one
+record per function, including whether it is pure (see memoization.py).
+Code is stored as raw int64 arrays.
+"""
+
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import zlib
+from array import array
+
+import opcodes
+from compiler import CodeObject, Compiler
+from stdlib import BUILTINS
+
+MAGIC = b"NOTPC"
+FORMAT_VERSION = 4
+FLAG_OPTIMIZED = 1
+HEADER = struct.Struct("<5sHIB32s")
+
+
+def _builtin_id(name, function):
+    """Names a builtin and the function bound to it, e.g. 'len=arrays.length'."""
+    qualname = getattr(function, "__qualname__", type(function).__qualname__)
+    return f"{name}={getattr(function, '__module__', None)}.{qualname}"
+
+
+def interface_crc():
+    """
+    Checksum of what compiled code depends on besides its source. Whether a
+    call compiles to CALL_BUILTIN depends on the builtins registered when it
+    was compiled, and counted loops hoist calls only to the stock len().
+    Hosts can register builtins, or rebind a name, at any time.
+    """
+    builtins = [_builtin_id(name, BUILTINS[name]) for name in sorted(BUILTINS)]
+    return zlib.crc32("\n".join(opcodes.OPNAMES + ["--"] + builtins).encode("utf-8"))
+
+
+def cache_path(source_path, cache_dir=None, optimized=False):
+    """
+    Returns where the cache for 'source_path' lives: next to it, or inside
+    'cache_dir'. Optimized bytecode gets its own file, e.g. fib.O.notpc.
+    """
+    root, ext = os.path.splitext(source_path)
+    filename = root + (".O" if optimized else "") + ext + "c"
+    if cache_dir is None:
+        return filename
+    return os.path.join(cache_dir, os.path.basename(filename))
+
+
+def source_hash(source_path):
+    with open(source_path, "rb") as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def _code_bytes(code):
+    # Code that already ran may hold quickened instructions; store the generic forms.
+    return array("q", opcodes.generic_code(code)).tobytes()
+
+
+def _code_list(data):
+    code = array("q")
+    code.frombytes(data)
+    return code.tolist()
+
+
+def store(compiler, path, digest, optimized=False):
+    """Writes an assembled Compiler to 'path'. Failures to write are ignored; the cache is best effort."""
+    if compiler.main_code is None:
+        compiler.assemble()
+    functions = [
+        (index, code.name, code.params, code.local_names, _code_bytes(code.code), code.pure)
+        for index, code in enumerate(compiler.functions_by_index) if code is not None
+    ]
+    payload = marshal.dumps((compiler.constants, compiler.names, _code_bytes(compiler.main_code.code), functions))
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, interface_crc(), FLAG_OPTIMIZED if optimized else 0, digest)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(temp_path, "wb") as f:
+            f.write(header)
+            f.write(payload)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load(path, digest, optimized=False):
+    """
+    Returns a ready-to-run Compiler from 'path', or None when the file is
+    missing, stale or written by an incompatible version.
+    """
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size <= HEADER.size:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, stored_crc, flags, stored_digest = HEADER.unpack_from(data)
+            if (magic != MAGIC or version != FORMAT_VERSION or stored_crc != interface_crc()
+                    or flags != (FLAG_OPTIMIZED if optimized else 0) or stored_digest != digest):
+                return None
+            with memoryview(data) as view, view[HEADER.size:] as payload:
+                try:
+                    constants, names, main_code, functions = marshal.loads(payload)
+                except (EOFError, ValueError, TypeError):
+                    return None
+
+    compiler = Compiler()
+    compiler.constants = constants
+    compiler.names = names
+    compiler.main_code = CodeObject("<main>", (), (), _code_list(main_code))
+    compiler.functions_by_index = [None] * len(names)
+    for index, name, params, local_names, code, pure in functions:
+        compiler.functions_by_index[index] = CodeObject(name, params, local_names, _code_list(code), pure=pure)
+    return compiler
@@ -0,0 +1,228 @@
+import operator
+
+from arrays import Array
+from interpreter import Environment
+from stdlib import BUILTINS
+
+BINARY_OPERATORS = {
+    "add": operator.add, "sub": operator.sub, "mult": operator.mul, "div": operator.floordiv,
+    "eq": operator.eq, "ne": operator.ne, "lt": operator.lt, "gt": operator.gt,
+    "le": operator.le, "ge": operator.ge,
+}
+
+
+class ClosureCompiler:
+    """
+    Translates an AST into a tree of pre-bound Python closures.
+
+    Every node is visited exactly once at compile time. Expression closures
+    take an Environment and return a value. Statement closures return None
+    to fall through, or a one-element tuple carrying the value of a 'return',
+    which blocks and loops hand straight back to the caller.
+    """
+
+    def compile(self, ast):
+        """Compiles a 'program' node into a callable taking an optional Environment."""
+        run = self._block(ast[1])
+
+        def program(env=None):
+            if env is None:
+                env = Environment()
+            run(env)
+
+        return program
+
+    def _block(self, statements):
+        compiled = tuple(self.statement(stmt) for stmt in statements)
+        if len(compiled) == 1:
+            return compiled[0]
+
+        def block(env):
+            for stmt in compiled:
+                result = stmt(env)
+                if result is not None:
+                    return result
+
+        return block
+
+    def statement(self, ast):
+        """Compiles a statement node."""
+        cmd = ast[0]
+
+        if cmd == "block":
+            return self._block(ast[1])
+
+        elif cmd == "line":
+            return self.statement(ast[2])
+
+        elif cmd == "assign":
+            name = ast[1]
+            value = self.expression(ast[2])
+
+            def assign(env):
+                env.vars[name] = value(env)
+
+            return assign
+
+        elif cmd == "print":
+            value = self.expression(ast[1])
+
+            def print_(env):
+                print(value(env))
+
+            return print_
+
+        elif cmd == "if":
+            condition = self.expression(ast[1])
+            then_branch = self.statement(ast[2])
+            if ast[3]:
+                else_branch = self.statement(ast[3])
+
+                def if_else(env):
+                    if condition(env):
+                        return then_branch(env)
+                    return else_branch(env)
+
+                return if_else
+
+            def if_(env):
+                if condition(env):
+                    return then_branch(env)
+
+            return if_
+
+        elif cmd == "while":
+            condition = self.expression(ast[1])
+            body = self.statement(ast[2])
+
+            def while_(env):
+                while condition(env):
+                    result = body(env)
+                    if result is not None:
+                        return result
+
+            return while_
+
+        elif cmd == "function":
+            name, params, body = ast[1], tuple(ast[2]), self.statement(ast[3])
+
+            def function(env):
+                env.vars[name] = ("function", params, body, env)
+
+            return function
+
+        elif cmd == "return":
+            value = self.expression(ast[1])
+
+            def return_(env):
+                return (value(env),)
+
+            return return_
+
+        elif cmd == "expression_statement":
+            value = self.expression(ast[1])
+
+            def expression_statement(env):
+                value(env)
+
+            return expression_statement
+
+        elif cmd == "store_index":
+            target, index, value = self.expression(ast[1]), self.expression(ast[2]), self.expression(ast[3])
+
+            def store_index(env):
+                container = target(env)
+                position = index(env)
+                container[position] = value(env)
+
+            return store_index
+
+        else:
+            raise RuntimeError(f"Unknown AST node type: {cmd}")
+
+    def expression(self, ast):
+        """Compiles an expression node."""
+        cmd = ast[0]
+
+        if cmd == "number":
+            constant = ast[1]
+            return lambda env: constant
+
+        elif cmd == "string":
+            constant = ast[1][1:-1]
+            return lambda env: constant
+
+        elif cmd == "variable":
+            name = ast[1]
+
+            def variable(env):
+                while env is not None:
+                    env_vars = env.vars
+                    if name in env_vars:
+                        return env_vars[name]
+                    env = env.parent
+                raise NameError(f"Variable '{name}' is not defined.")
+
+            return variable
+
+        elif cmd in BINARY_OPERATORS:
+            op = BINARY_OPERATORS[cmd]
+            left = self.expression(ast[1])
+            if ast[2][0] == "number":
+                constant = ast[2][1]
+                return lambda env: op(left(env), constant)
+            right = self.expression(ast[2])
+            return lambda env: op(left(env), right(env))
+
+        elif cmd == "call":
+            return self._call(ast[1], ast[2])
+
+        elif cmd == "array":
+            elements = tuple(self.expression(element) for element in ast[1])
+            return lambda env: Array([element(env) for element in elements])
+
+        elif cmd == "index":
+            target, index = self.expression(ast[1]), self.expression(ast[2])
+            return lambda env: target(env)[index(env)]
+
+        else:
+            raise RuntimeError(f"Unknown AST node type: {cmd}")
+
+    def _call(self, func_name, arg_nodes):
+        args = tuple(self.expression(arg) for arg in arg_nodes)
+        lookup = self.expression(("variable", func_name))
+        num_args = len(args)
+        builtin = BUILTINS.get(func_name)
+        if builtin is not None:
+            variable = lookup
+
+            def lookup(env):
+                # A builtin stays reachable until the program binds the name itself.
+                try:
+                    return variable(env)
+                except NameError:
+                    return builtin
+
+        def call(env):
+            callee = lookup(env)
+            if not isinstance(callee, tuple) or callee[0] != "function":
+                if builtin is not None and callee is builtin:
+                    return builtin(*[arg(env) for arg in args])
+                raise TypeError(f"'{func_name}' is not a function.")
+
+            _, params, body, definition_env = callee
+            values = [arg(env) for arg in args]
+            if len(params) != num_args:
+                raise TypeError(f"Function '{func_name}' expects {len(params)} arguments, but got {num_args}.")
+
+            call_env = Environment(parent=definition_env)
+            call_env.vars.update(zip(params, values))
+            result = body(call_env)
+            return result[0] if result is not None else None
+
+        return call
+
+
+def compile_closures(ast):
+    """Convenience wrapper: compiles a 'program' AST into a runnable closure."""
+    return ClosureCompiler().compile(ast)
@@ -1,3 +1,162 @@
+import operator
+
+import opcodes
+from arrays import Array, length
+from limits import product_size, value_size
+from memoization import MISSING, find_pure_functions, memo_key
+from stdlib import BUILTINS
+
+BINARY_OPERATORS = {
+    "BINARY_ADD": operator.add, "BINARY_SUB": operator.sub, "BINARY_MUL": operator.mul,
+    "BINARY_DIV": operator.floordiv, "BINARY_EQ": operator.eq, "BINARY_NE": operator.ne,
+    "BINARY_LT": operator.lt, "BINARY_GT": operator.gt, "BINARY_LE": operator.le,
+    "BINARY_GE": operator.ge,
+}
+
+# AST operator node -> the instruction that computes it
+BINARY_OPCODES = {
+    "add": "BINARY_ADD", "sub": "BINARY_SUB", "mult": "BINARY_MUL", "div": "BINARY_DIV",
+    "eq": "BINARY_EQ", "ne": "BINARY_NE", "lt": "BINARY_LT", "gt": "BINARY_GT",
+    "le": "BINARY_LE", "ge": "BINARY_GE",
+}
+
+UNSET = object()
+
+# Builtins whose result depends only on their arguments, so counted_loop() may hoist calls to them
+INVARIANT_BUILTINS = {"len": length}
+
+
+def assigned_names(statements, names=None):
+    """Collects the names assigned by a statement list, not descending into nested functions."""
+    if names is None:
+        names = []
+    for stmt in statements:
+        while stmt[0] == "line":
+            stmt = stmt[2]
+        if stmt[0] == "assign":
+            names.append(stmt[1])
+        elif stmt[0] == "block":
+            assigned_names(stmt[1], names)
+        elif stmt[0] == "if":
+            assigned_names(stmt[2][1], names)
+            if stmt[3]:
+                assigned_names(stmt[3][1], names)
+        elif stmt[0] == "while":
+            assigned_names(stmt[2][1], names)
+    return names
+
+
+def shadow_flag(name):
+    """The hidden global that is true once the function 'name', which shadows a builtin, is defined."""
+    return f"<defined {name}>"
+
+
+def defined_functions(statements, names=None):
+    """Collects the names of all functions a statement list defines, including nested ones."""
+    if names is None:
+        names = set()
+    for stmt in statements:
+        while stmt[0] == "line":
+            stmt = stmt[2]
+        if stmt[0] == "function":
+            names.add(stmt[1])
+            defined_functions(stmt[3][1], names)
+        elif stmt[0] == "block":
+            defined_functions(stmt[1], names)
+        elif stmt[0] == "if":
+            defined_functions(stmt[2][1], names)
+            if stmt[3]:
+                defined_functions(stmt[3][1], names)
+        elif stmt[0] == "while":
+            defined_functions(stmt[2][1], names)
+    return names
+
+
+def _invariant(expr, assigned, invariant_calls):
+    """True when 'expr' gives the same value on every iteration of a loop that assigns 'assigned'."""
+    kind = expr[0]
+    if kind in ("number", "string"):
+        return True
+    if kind == "variable":
+        return expr[1] not in assigned
+    if kind in ("add", "sub", "mult", "div"):
+        return _invariant(expr[1], assigned, invariant_calls) and _invariant(expr[2], assigned, invariant_calls)
+    if kind == "call":
+        return expr[1] in invariant_calls and all(_invariant(arg, assigned, invariant_calls) for arg in expr[2])
+    return False
+
+
+def counted_loop(node, invariant_calls=()):
+    """
+    Recognizes a counted loop:
+
+        while (i < limit) { ...; i = i + step }
+
+    'i' is the induction variable: the final statement is its only
+    assignment in the body, and 'step' is an integer constant. The limit
+    must be loop-invariant: built from constants, variables the body never
+    assigns and calls to 'invariant_calls'. '<=' works the same way.
+    Returns (counter, limit, step, inclusive, statements, step_line), where
+    'statements' is the body without the step and 'step_line' the step's
+    source line (or None), or None when the loop has another shape.
+    """
+    condition, statements = node[1], node[2][1]
+    if condition[0] not in ("lt", "le") or condition[1][0] != "variable" or not statements:
+        return None
+    counter, limit = condition[1][1], condition[2]
+    step_statement, step_line = statements[-1], None
+    while step_statement[0] == "line":
+        step_line, step_statement = step_statement[1], step_statement[2]
+    if step_statement[0] != "assign" or step_statement[1] != counter or step_statement[2][0] != "add":
+        return None
+    left, right = step_statement[2][1], step_statement[2][2]
+    if left[0] == "number":
+        left, right = right, left
+    if left != ("variable", counter) or right[0] != "number" or type(right[1]) is not int:
+        return None
+    assigned = assigned_names(statements)
+    if assigned.count(counter) != 1 or not _invariant(limit, set(assigned), invariant_calls):
+        return None
+    return counter, limit, right[1], condition[0] == "le", statements[:-1], step_line
+
+
+def quickened_forms(op_name):
+    """Maps operand types to the specialized opcodes that Compiler.run() may rewrite 'op_name' into."""
+    forms = {}
+    for kind, suffix in ((int, "_INT"), (str, "_STR")):
+        if op_name + suffix in opcodes.OPMAP:
+            forms[kind] = opcodes.OPMAP[op_name + suffix]
+    return forms
+
+
+class CodeObject:
+    """An assembled unit of bytecode: the main program or one function."""
+    __slots__ = ("name", "params", "local_names", "code", "lines", "pure")
+
+    def __init__(self, name, params, local_names, code, lines=None, pure=False):
+        self.name = name
+        self.params = params
+        self.local_names = local_names
+        self.code = code
+        # Source line of each instruction, when the AST carried "line" nodes
+        self.lines = lines
+        # True when memoization.find_pure_functions() found the result depends only on the arguments
+        self.pure = pure
+
+
+class Frame:
+    """Where a VM call returns to. Compiler.run() recycles these through a free list."""
+    __slots__ = ("return_ip", "return_code", "return_locals", "function", "memo")
+
+    def __init__(self):
+        self.return_ip = 0
+        self.return_code = None
+        self.return_locals = None
+        self.function = None
+        # (cache, key) while a memoized call is waiting for its result
+        self.memo = None
+
+
 class Compiler:
     """Compiles an Abstract Syntax Tree (AST) into a list of bytecode instructions."""
 
@@ -6,19 +165,49 @@ class Compiler:
         self.bytecode = []
         self.functions = {}
         self._current_bytecode_list = self.bytecode
+        # (instruction index, source line) pairs, recorded from "line" nodes
+        self.bytecode_lines = []
+        self._current_lines = self.bytecode_lines
+        # Maps local names to frame slots while compiling a function body
+        self._local_slots = None
+        self._local_names = None
+        # Numbers the hidden variables that hold hoisted loop limits
+        self._hidden_count = 0
+        self.pure_functions = frozenset()
+        # Every function the program defines; calls to other names in stdlib.BUILTINS use CALL_BUILTIN,
+        # and calls to names in both check at run time whether the definition has run
+        self.function_names = set()
+        # Filled in by assemble()
+        self.constants = []
+        self.names = []
+        self.main_code = None
+        self.functions_by_index = []
 
     def compile(self, ast):
         """Recursively traverses the AST and generates corresponding bytecode."""
         cmd = ast[0]
 
         if cmd == "program":
+            self.pure_functions = find_pure_functions(ast)
+            self.function_names = defined_functions(ast[1])
+            for name in sorted(self.function_names & BUILTINS.keys()):
+                # Cleared until the program's own definition of the name has run
+                self._current_bytecode_list.append(("LOAD_CONST", False))
+                self._current_bytecode_list.append(("STORE_GLOBAL", shadow_flag(name)))
             for stmt in ast[1]:
                 self.compile(stmt)
 
+        elif cmd == "line":
+            self._current_lines.append((len(self._current_bytecode_list), ast[1]))
+            self.compile(ast[2])
+
         elif cmd == "assign":
             var_name = ast[1]
             self.compile(ast[2])
-            self._current_bytecode_list.append(("STORE_NAME", var_name))
+            if self._local_slots is not None and var_name in self._local_slots:
+                self._current_bytecode_list.append(("STORE_FAST", self._local_slots[var_name]))
+            else:
+                self._current_bytecode_list.append(("STORE_GLOBAL", var_name))
 
         elif cmd == "print":
             self.compile(ast[1])
@@ -31,15 +220,15 @@ class Compiler:
             self._current_bytecode_list.append(("LOAD_CONST", ast[1][1:-1]))
 
         elif cmd == "variable":
-            self._current_bytecode_list.append(("LOAD_NAME", ast[1]))
+            if self._local_slots is not None and ast[1] in self._local_slots:
+                self._current_bytecode_list.append(("LOAD_FAST", self._local_slots[ast[1]]))
+            else:
+                self._current_bytecode_list.append(("LOAD_GLOBAL", ast[1]))
 
-        elif cmd in ("add", "sub", "mult", "div", "eq", "ne", "lt", "gt", "le", "ge"):
-            op_map = { "add": "BINARY_ADD", "sub": "BINARY_SUB", "mult": "BINARY_MUL", "div": "BINARY_DIV",
-                       "eq": "BINARY_EQ", "ne": "BINARY_NE", "lt": "BINARY_LT", "gt": "BINARY_GT",
-                       "le": "BINARY_LE", "ge": "BINARY_GE" }
+        elif cmd in BINARY_OPCODES:
             self.compile(ast[1])
             self.compile(ast[2])
-            self._current_bytecode_list.append((op_map[cmd],))
+            self._current_bytecode_list.append((BINARY_OPCODES[cmd],))
 
         elif cmd == "block":
             for stmt in ast[1]:
@@ -64,6 +253,10 @@ class Compiler:
                 self._current_bytecode_list[jump_if_false_pos] = ("JUMP_IF_FALSE", end_target)
 
         elif cmd == "while":
+            loop = counted_loop(ast, self._invariant_builtins())
+            if loop is not None:
+                self._compile_counted_loop(*loop)
+                return
             loop_start = len(self._current_bytecode_list)
             self.compile(ast[1])
             jump_pos = len(self._current_bytecode_list)
@@ -75,112 +268,828 @@ class Compiler:
         
         elif cmd == "function":
             name, params, body = ast[1], ast[2], ast[3]
-            func_bytecode = []
-            self._current_bytecode_list = func_bytecode
+            outer_bytecode, outer_lines, outer_slots = self._current_bytecode_list, self._current_lines, self._local_slots
+            outer_names = self._local_names
+            # Parameters take the first slots, in order; other assigned names follow.
+            local_names = list(params)
+            for local in assigned_names(body[1]):
+                if local not in local_names:
+                    local_names.append(local)
+            func_bytecode, func_lines = [], []
+            self._current_bytecode_list, self._current_lines = func_bytecode, func_lines
+            self._local_slots = {local: slot for slot, local in enumerate(local_names)}
+            # Counted loops append their hidden limit variables to it
+            self._local_names = local_names
             self.compile(body)
-            if not func_bytecode or func_bytecode[-1][0] != "RETURN":
+            if not func_bytecode or func_bytecode[-1][0] not in ("RETURN", "TAIL_CALL"):
                 func_bytecode.append(("LOAD_CONST", None))
                 func_bytecode.append(("RETURN",))
-            self.functions[name] = {"params": params, "bytecode": func_bytecode}
-            self._current_bytecode_list = self.bytecode
+            self.functions[name] = {"params": params, "locals": tuple(local_names), "bytecode": func_bytecode,
+                                    "lines": func_lines, "pure": name in self.pure_functions}
+            self._current_bytecode_list, self._current_lines, self._local_slots = outer_bytecode, outer_lines, outer_slots
+            self._local_names = outer_names
+            if name in BUILTINS:
+                self._current_bytecode_list.append(("LOAD_CONST", True))
+                self._current_bytecode_list.append(("STORE_GLOBAL", shadow_flag(name)))
 
         elif cmd == "call":
             name, args = ast[1], ast[2]
             for arg in args:
                 self.compile(arg)
-            self._current_bytecode_list.append(("CALL", name, len(args)))
+            if name in BUILTINS and name in self.function_names:
+                self._compile_shadowed_call(name, len(args))
+            else:
+                op = "CALL_BUILTIN" if self._is_builtin(name) else "CALL"
+                self._current_bytecode_list.append((op, name, len(args)))
 
-        elif cmd == "return":
+        elif cmd == "array":
+            for element in ast[1]:
+                self.compile(element)
+            self._current_bytecode_list.append(("BUILD_ARRAY", len(ast[1])))
+
+        elif cmd == "index":
+            self.compile(ast[1])
+            self.compile(ast[2])
+            self._current_bytecode_list.append(("LOAD_INDEX",))
+
+        elif cmd == "store_index":
             self.compile(ast[1])
-            self._current_bytecode_list.append(("RETURN",))
+            self.compile(ast[2])
+            self.compile(ast[3])
+            self._current_bytecode_list.append(("STORE_INDEX",))
+
+        elif cmd == "return":
+            value = ast[1]
+            if value[0] == "call" and self._local_slots is not None and value[1] not in BUILTINS:
+                # 'return f(...)' inside a function: f reuses the current frame
+                name, args = value[1], value[2]
+                for arg in args:
+                    self.compile(arg)
+                self._current_bytecode_list.append(("TAIL_CALL", name, len(args)))
+            else:
+                self.compile(value)
+                self._current_bytecode_list.append(("RETURN",))
 
         elif cmd == "expression_statement":
             self.compile(ast[1])
             self._current_bytecode_list.append(("POP_TOP",))
 
-    def run(self):
-        """Executes the generated bytecode using a stack-based VM."""
+    def _is_builtin(self, name):
+        return name in BUILTINS and name not in self.function_names
+
+    def _compile_shadowed_call(self, name, num_args):
+        """
+        Compiles a call to a builtin name the program also defines as a
+        function. As in the interpreters, the builtin is called until the
+        definition has run. The arguments are already on the stack.
+        """
+        code = self._current_bytecode_list
+        code.append(("LOAD_GLOBAL", shadow_flag(name)))
+        jump_pos = len(code)
+        code.append(("JUMP_IF_FALSE", 0))
+        code.append(("CALL", name, num_args))
+        code.append(("JUMP", 0))
+        code[jump_pos] = ("JUMP_IF_FALSE", len(code))
+        code.append(("CALL_BUILTIN", name, num_args))
+        code[jump_pos + 2] = ("JUMP", len(code))
+
+    def _invariant_builtins(self):
+        return {name for name, function in INVARIANT_BUILTINS.items()
+                if self._is_builtin(name) and BUILTINS[name] is function}
+
+    def _hidden_variable(self):
+        """Returns a new variable name no program can spell; a local slot when compiling a function."""
+        name = f"<limit{self._hidden_count}>"
+        self._hidden_count += 1
+        if self._local_slots is not None:
+            self._local_slots[name] = len(self._local_names)
+            self._local_names.append(name)
+        return name
+
+    def _compile_counted_loop(self, counter, limit, step, inclusive, statements, step_line):
+        """
+        Compiles a loop recognized by counted_loop(). The limit is evaluated
+        once, into a hidden variable, and each iteration ends with a single
+        FOR_RANGE instruction that steps the counter, tests it and jumps back.
+        """
+        code = self._current_bytecode_list
+        limit_name = self._hidden_variable()
+        # The first test evaluates the counter before the limit, like the original condition
+        self.compile(("variable", counter))
+        self.compile(("assign", limit_name, limit))
+        self.compile(("variable", limit_name))
+        code.append(("BINARY_LE" if inclusive else "BINARY_LT",))
+        jump_pos = len(code)
+        code.append(("JUMP_IF_FALSE", 0))
+        loop_start = len(code)
+        for stmt in statements:
+            self.compile(stmt)
+        if step_line is not None:
+            self._current_lines.append((len(code), step_line))
+        if self._local_slots is not None:
+            # The body assigns the counter, so inside a function it is a local
+            slots = self._local_slots
+            code.append(("FOR_RANGE_FAST", loop_start, slots[counter], slots[limit_name], step, inclusive))
+        else:
+            code.append(("FOR_RANGE_GLOBAL", loop_start, counter, limit_name, step, inclusive))
+        code[jump_pos] = ("JUMP_IF_FALSE", len(code))
+
+    def assemble(self):
+        """
+        Encodes the symbolic bytecode into flat integer code with a shared
+        constant pool and name table. Functions are indexed by the slot of
+        their name in the name table, so CALL needs no dict lookup.
+        """
+        self.constants = []
+        self.names = []
+        self._constant_index = {}
+        self._name_index = {}
+
+        self.main_code = CodeObject("<main>", (), (), self._encode(self.bytecode + [("HALT",)]),
+                                    self._expand_lines(self.bytecode_lines, len(self.bytecode) + 1))
+        function_codes = {}
+        for name, func in self.functions.items():
+            function_codes[self._name(name)] = CodeObject(
+                name, tuple(func["params"]), func["locals"], self._encode(func["bytecode"]),
+                self._expand_lines(func["lines"], len(func["bytecode"])), func["pure"])
+        self.functions_by_index = [function_codes.get(index) for index in range(len(self.names))]
+
+    def _expand_lines(self, line_table, length):
+        """Turns (index, line) pairs into one line number per instruction, or None without line info."""
+        if not line_table:
+            return None
+        lines = [None] * length
+        for (start, line), (end, _) in zip(line_table, line_table[1:] + [(length, None)]):
+            lines[start:end] = [line] * max(0, end - start)
+        return lines[:length]
+
+    def _constant(self, value):
+        key = (type(value), value)
+        if key not in self._constant_index:
+            self._constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return self._constant_index[key]
+
+    def _name(self, name):
+        if name not in self._name_index:
+            self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return self._name_index[name]
+
+    def _encode(self, instructions):
+        code = []
+        for op_name, *args in instructions:
+            op = opcodes.OPMAP[op_name]
+            if op in opcodes.HAS_CONST:
+                operand = self._constant(args[0])
+            elif op in opcodes.HAS_NAME:
+                operand = self._name(args[0])
+            elif op in opcodes.HAS_LOCAL or op in opcodes.HAS_COUNT:
+                operand = args[0]
+            elif op in opcodes.HAS_JUMP:
+                operand = args[0] * 2
+            elif op in opcodes.HAS_CALL:
+                name, num_args = args
+                if num_args > opcodes.CALL_ARGC_MASK:
+                    raise SyntaxError(f"call to '{name}' has too many arguments")
+                operand = (self._name(name) << opcodes.CALL_ARGC_BITS) | num_args
+            elif op in opcodes.HAS_LOOP:
+                target, counter, limit, step, inclusive = args
+                if op == opcodes.FOR_RANGE_GLOBAL:
+                    counter, limit = self._name(counter), self._name(limit)
+                descriptor = self._constant((counter, limit, step, inclusive))
+                operand = (descriptor << opcodes.LOOP_TARGET_BITS) | target * 2
+            elif op in opcodes.HAS_INCREMENT:
+                target, step = args
+                index = target if op == opcodes.INCREMENT_FAST else self._name(target)
+                operand = (index << opcodes.INCREMENT_BITS) | (step - opcodes.INCREMENT_MIN)
+            else:
+                operand = 0
+            code.append(op)
+            code.append(operand)
+        return code
+
+    def run(self, profiler=None, memo=None, jit=None, globals_vars=None, output=None, limits=None):
+        """Executes the assembled bytecode to completion. See execute() for the arguments."""
+        for _ in self.execute(profiler, memo, jit, globals_vars, output, limits=limits):
+            pass
+
+    def execute(self, profiler=None, memo=None, jit=None, globals_vars=None, output=None, slice_size=None,
+                limits=None):
+        """
+        Generator that executes the assembled bytecode using a stack-based VM with table-driven dispatch.
+        With a profiler.Profiler, a separate instrumented loop times every instruction.
+        With a memoization.MemoTable, calls to pure functions go through its caches.
+        With a jit.Jit, functions called often enough are compiled to Python.
+        'globals_vars' is a list with one value (or UNSET) per entry of self.names,
+        used as the global variables and updated in place.
+        With an 'output' list, PRINT appends values to it instead of printing them.
+        With a 'slice_size', it yields after every 'slice_size' instructions and
+        resumes where it stopped; otherwise it runs to the end without yielding.
+        Profiled runs and calls made from JIT-compiled code are never suspended.
+        With limits.Limits, it raises limits.LimitExceeded once the run goes
+        past one of them. Metered runs count their slices in steps rather
+        than instructions, and cannot be profiled or use the JIT.
+        """
+        if limits is not None and (profiler is not None or jit is not None):
+            raise ValueError("metered runs cannot be profiled or use the JIT")
+        if self.main_code is None:
+            self.assemble()
+
+        constants = self.constants
+        names = self.names
+        functions_by_index = self.functions_by_index
+
         stack = []
-        globals_vars = {}
+        push = stack.append
+        pop = stack.pop
+        if globals_vars is None:
+            globals_vars = [UNSET] * len(names)
         call_stack = []
+        # Frames popped by RETURN, reused by the next CALL
+        free_frames = []
+        # Per function: the UNSET values that follow the arguments in a fresh locals list
+        padding = [[UNSET] * (len(func.local_names) - len(func.params)) if func else None
+                   for func in functions_by_index]
+        # Per function and local slot: the index of the global with the same name, or None
+        name_indices = {name: index for index, name in enumerate(names)}
+        global_fallbacks = {func: [name_indices.get(name) for name in func.local_names]
+                            for func in functions_by_index if func is not None}
+        code = self.main_code.code
+        frame_locals = None
         ip = 0
-        
-        active_bytecode = self.bytecode
-        
-        while ip < len(active_bytecode):
-            op, *args = active_bytecode[ip]
-            current_frame = call_stack[-1] if call_stack else None
-            
-            ip += 1
-
-            if op == "LOAD_CONST":
-                stack.append(args[0])
-            elif op == "POP_TOP":
-                stack.pop()
-            elif op == "PRINT":
-                print(stack.pop())
-            
-            elif op == "LOAD_NAME":
-                name = args[0]
-                if current_frame and name in current_frame["locals"]:
-                    stack.append(current_frame["locals"][name])
-                elif name in globals_vars:
-                    stack.append(globals_vars[name])
-                else:
-                    raise NameError(f"name '{name}' is not defined")
-            
-            elif op == "STORE_NAME":
-                name = args[0]
-                value = stack.pop()
-                if current_frame:
-                    current_frame["locals"][name] = value
+
+        def load_const(arg):
+            push(constants[arg])
+
+        def load_fast(arg):
+            value = frame_locals[arg]
+            if value is UNSET:
+                # Not assigned in this call yet: read the global of the same name.
+                function = call_stack[-1].function
+                index = global_fallbacks[function][arg]
+                if index is None:
+                    raise NameError(f"name '{function.local_names[arg]}' is not defined")
+                load_global(index)
+            else:
+                push(value)
+
+        def store_fast(arg):
+            frame_locals[arg] = pop()
+
+        def load_global(arg):
+            value = globals_vars[arg]
+            if value is UNSET:
+                raise NameError(f"name '{names[arg]}' is not defined")
+            push(value)
+
+        def store_global(arg):
+            globals_vars[arg] = pop()
+
+        def increment_fast(arg):
+            slot = arg >> opcodes.INCREMENT_BITS
+            if frame_locals[slot] is UNSET:
+                load_fast(slot)
+                frame_locals[slot] = pop()
+            frame_locals[slot] += (arg & opcodes.INCREMENT_MASK) + opcodes.INCREMENT_MIN
+
+        def increment_global(arg):
+            index = arg >> opcodes.INCREMENT_BITS
+            if globals_vars[index] is UNSET:
+                raise NameError(f"name '{names[index]}' is not defined")
+            globals_vars[index] += (arg & opcodes.INCREMENT_MASK) + opcodes.INCREMENT_MIN
+
+        def for_range_fast(arg):
+            slot, limit, step, inclusive = constants[arg >> opcodes.LOOP_TARGET_BITS]
+            value = frame_locals[slot]
+            if value is UNSET:
+                load_fast(slot)
+                value = pop()
+            value = value + step
+            frame_locals[slot] = value
+            if (value <= frame_locals[limit]) if inclusive else (value < frame_locals[limit]):
+                return arg & opcodes.LOOP_TARGET_MASK
+
+        def for_range_global(arg):
+            # The loop's first test already read the counter, so it is set
+            index, limit, step, inclusive = constants[arg >> opcodes.LOOP_TARGET_BITS]
+            value = globals_vars[index] + step
+            globals_vars[index] = value
+            if (value <= globals_vars[limit]) if inclusive else (value < globals_vars[limit]):
+                return arg & opcodes.LOOP_TARGET_MASK
+
+        def pop_top(arg):
+            pop()
+
+        def print_(arg):
+            print(pop())
+
+        def print_to_output(arg):
+            output.append(pop())
+
+        # Quickening. An adaptive handler rewrites its own instruction to the
+        # specialized form for its operands' type, if there is one. A
+        # specialized handler checks the type again. When the check fails, it
+        # puts the generic opcode back and marks the site megamorphic, so the
+        # site is never specialized again.
+        int_type, str_type, type_of = int, str, type
+        megamorphic = set()
+
+        def specialize(forms, a, b):
+            kind = type_of(a)
+            if kind is type_of(b) and kind in forms and (id(code), ip) not in megamorphic:
+                code[ip] = forms[kind]
+
+        def deoptimize(op):
+            megamorphic.add((id(code), ip))
+            code[ip] = op
+
+        def binary(fn, forms=None):
+            if not forms:
+                def handler(arg):
+                    b = pop()
+                    stack[-1] = fn(stack[-1], b)
+                return handler
+
+            def adaptive(arg):
+                b = pop()
+                a = stack[-1]
+                specialize(forms, a, b)
+                stack[-1] = fn(a, b)
+            return adaptive
+
+        def binary_add_int(arg):
+            b = pop()
+            a = stack[-1]
+            if type_of(a) is not int_type or type_of(b) is not int_type:
+                deoptimize(opcodes.BINARY_ADD)
+            stack[-1] = a + b
+
+        def binary_add_str(arg):
+            b = pop()
+            a = stack[-1]
+            if type_of(a) is not str_type or type_of(b) is not str_type:
+                deoptimize(opcodes.BINARY_ADD)
+            stack[-1] = a + b
+
+        def binary_sub_int(arg):
+            b = pop()
+            a = stack[-1]
+            if type_of(a) is not int_type or type_of(b) is not int_type:
+                deoptimize(opcodes.BINARY_SUB)
+            stack[-1] = a - b
+
+        def binary_mul_int(arg):
+            b = pop()
+            a = stack[-1]
+            if type_of(a) is not int_type or type_of(b) is not int_type:
+                deoptimize(opcodes.BINARY_MUL)
+            stack[-1] = a * b
+
+        def jump(arg):
+            return arg
+
+        def jump_if_false(arg):
+            if not pop():
+                return arg
+
+        def compare_jump(fn, forms):
+            def adaptive(arg):
+                b = pop()
+                a = pop()
+                specialize(forms, a, b)
+                if not fn(a, b):
+                    return arg
+            return adaptive
+
+        def jump_if_not_eq_int(arg):
+            b = pop()
+            a = pop()
+            if type_of(a) is not int_type or type_of(b) is not int_type:
+                deoptimize(opcodes.JUMP_IF_NOT_EQ)
+            if not a == b:
+                return arg
+
+        def jump_if_not_ne_int(arg):
+            b = pop()
+            a = pop()
+            if type_of(a) is not int_type or type_of(b) is not int_type:
+                deoptimize(opcodes.JUMP_IF_NOT_NE)
+            if not a != b:
+                return arg
+
+        def jump_if_not_lt_int(arg):
+            b = pop()
+            a = pop()
+            if type_of(a) is not int_type or type_of(b) is not int_type:
+                deoptimize(opcodes.JUMP_IF_NOT_LT)
+            if not a < b:
+                return arg
+
+        def jump_if_not_gt_int(arg):
+            b = pop()
+            a = pop()
+            if type_of(a) is not int_type or type_of(b) is not int_type:
+                deoptimize(opcodes.JUMP_IF_NOT_GT)
+            if not a > b:
+                return arg
+
+        def jump_if_not_le_int(arg):
+            b = pop()
+            a = pop()
+            if type_of(a) is not int_type or type_of(b) is not int_type:
+                deoptimize(opcodes.JUMP_IF_NOT_LE)
+            if not a <= b:
+                return arg
+
+        def jump_if_not_ge_int(arg):
+            b = pop()
+            a = pop()
+            if type_of(a) is not int_type or type_of(b) is not int_type:
+                deoptimize(opcodes.JUMP_IF_NOT_GE)
+            if not a >= b:
+                return arg
+
+        def call(arg):
+            nonlocal code, frame_locals
+            name_index, num_args = arg >> opcodes.CALL_ARGC_BITS, arg & opcodes.CALL_ARGC_MASK
+            func = functions_by_index[name_index]
+            if not func: raise NameError(f"function '{names[name_index]}' is not defined")
+
+            if len(func.params) != num_args:
+                raise TypeError(f"function '{names[name_index]}' takes {len(func.params)} arguments but {num_args} were given")
+
+            # The function table is fixed for the whole run, so a checked site stays valid.
+            code[ip] = opcodes.CALL_EXACT_ARGS
+            first_arg = len(stack) - num_args
+            new_locals = stack[first_arg:] + padding[name_index]
+            del stack[first_arg:]
+            frame = free_frames.pop() if free_frames else Frame()
+            frame.return_ip = ip + 2
+            frame.return_code = code
+            frame.return_locals = frame_locals
+            frame.function = func
+            call_stack.append(frame)
+            code = func.code
+            frame_locals = new_locals
+            return 0
+
+        def call_exact_args(arg):
+            nonlocal code, frame_locals
+            name_index, num_args = arg >> opcodes.CALL_ARGC_BITS, arg & opcodes.CALL_ARGC_MASK
+            func = functions_by_index[name_index]
+            first_arg = len(stack) - num_args
+            new_locals = stack[first_arg:] + padding[name_index]
+            del stack[first_arg:]
+            frame = free_frames.pop() if free_frames else Frame()
+            frame.return_ip = ip + 2
+            frame.return_code = code
+            frame.return_locals = frame_locals
+            frame.function = func
+            call_stack.append(frame)
+            code = func.code
+            frame_locals = new_locals
+            return 0
+
+        def tail_call(arg):
+            nonlocal code, frame_locals
+            name_index, num_args = arg >> opcodes.CALL_ARGC_BITS, arg & opcodes.CALL_ARGC_MASK
+            func = functions_by_index[name_index]
+            if not func: raise NameError(f"function '{names[name_index]}' is not defined")
+
+            if len(func.params) != num_args:
+                raise TypeError(f"function '{names[name_index]}' takes {len(func.params)} arguments but {num_args} were given")
+
+            first_arg = len(stack) - num_args
+            new_locals = stack[first_arg:] + padding[name_index]
+            del stack[first_arg:]
+            # Keep the caller's return address; only the callee changes
+            call_stack[-1].function = func
+            code = func.code
+            frame_locals = new_locals
+            return 0
+
+        def return_(arg):
+            nonlocal code, frame_locals
+            frame = call_stack.pop()
+            code = frame.return_code
+            frame_locals = frame.return_locals
+            # A pooled frame must not keep its caller's locals alive
+            frame.return_code = frame.return_locals = None
+            free_frames.append(frame)
+            return frame.return_ip
+
+        def halt(arg):
+            return -1
+
+        builtins_by_index = [BUILTINS.get(name) for name in names]
+
+        def call_builtin(arg):
+            # The host function runs on the operand stack directly: no frame, no locals list.
+            function = builtins_by_index[arg >> opcodes.CALL_ARGC_BITS]
+            if function is None:
+                # The builtin was unregistered after this code was compiled
+                raise NameError(f"builtin '{names[arg >> opcodes.CALL_ARGC_BITS]}' is not registered")
+            num_args = arg & opcodes.CALL_ARGC_MASK
+            if num_args == 1:
+                stack[-1] = function(stack[-1])
+            elif num_args == 2:
+                right = pop()
+                stack[-1] = function(stack[-1], right)
+            else:
+                first_arg = len(stack) - num_args
+                args = stack[first_arg:]
+                del stack[first_arg:]
+                push(function(*args))
+
+        def build_array(arg):
+            first = len(stack) - arg
+            elements = stack[first:]
+            del stack[first:]
+            push(Array(elements))
+
+        def load_index(arg):
+            index = pop()
+            stack[-1] = stack[-1][index]
+
+        def store_index(arg):
+            value = pop()
+            index = pop()
+            pop()[index] = value
+
+        def checked_result(handler):
+            def checked(arg):
+                handler(arg)
+                # A sum of integers is at most one bit longer than its operands
+                if type(stack[-1]) is not int:
+                    check_size(value_size(stack[-1]))
+            return checked
+
+        def checked_product(handler):
+            def checked(arg):
+                # Before multiplying: "x" * 10**12 must fail without building the string
+                left, right = stack[-2], stack[-1]
+                if type(left) is not int or type(right) is not int or left.bit_length() + right.bit_length() > max_bits:
+                    check_size(product_size(left, right))
+                handler(arg)
+            return checked
+
+        def checked_call(handler):
+            def checked(arg):
+                target = handler(arg)
+                if len(call_stack) > max_depth or len(stack) > max_stack:
+                    limits.exceeded(0, len(call_stack), len(stack))
+                return target
+            return checked
+
+        def checked_builtin(arg):
+            num_args = arg & opcodes.CALL_ARGC_MASK
+            limits.check_builtin(builtins_by_index[arg >> opcodes.CALL_ARGC_BITS], stack[len(stack) - num_args:])
+            call_builtin(arg)
+            check_size(value_size(stack[-1]))
+
+        def global_value(index):
+            value = globals_vars[index]
+            if value is UNSET:
+                raise NameError(f"name '{names[index]}' is not defined")
+            return value
+
+        def undefined(name):
+            raise NameError(f"name '{name}' is not defined")
+
+        def promote(index):
+            """Counts a call and compiles the function when it reaches the JIT threshold."""
+            call_counts[index] += 1
+            if call_counts[index] == jit.threshold:
+                native[index] = jit.compile(functions_by_index[index], self, jit_runtime)
+                if native[index] is not None:
+                    entries[index] = native[index]
+
+        def jit_call(arg):
+            if deep:
+                return call(arg)
+            index, num_args = arg >> opcodes.CALL_ARGC_BITS, arg & opcodes.CALL_ARGC_MASK
+            fn = native[index]
+            if fn is None:
+                if functions_by_index[index] is None:
+                    return call(arg)
+                promote(index)
+                fn = native[index]
+                if fn is None:
+                    return call(arg)
+            if len(functions_by_index[index].params) != num_args:
+                return call(arg)
+            first_arg = len(stack) - num_args
+            args = stack[first_arg:]
+            del stack[first_arg:]
+            push(fn(*args, native_depth + 1))
+            return None
+
+        def run_nested(index, args):
+            """Runs one call in a nested dispatch loop and returns its result."""
+            nonlocal code, frame_locals, ip
+            saved = code, frame_locals, ip
+            func = functions_by_index[index]
+            new_locals = list(args) + padding[index]
+            # Returning to ip -1 ends the loop below
+            frame = free_frames.pop() if free_frames else Frame()
+            frame.return_ip = -1
+            frame.return_code = code
+            frame.return_locals = frame_locals
+            frame.function = func
+            call_stack.append(frame)
+            code, frame_locals, ip = func.code, new_locals, 0
+            while ip >= 0:
+                target = dispatch[code[ip]](code[ip + 1])
+                ip = ip + 2 if target is None else target
+            code, frame_locals, ip = saved
+            return pop()
+
+        def vm_entry(index):
+            """Returns a stub through which compiled code runs function 'index' in the VM."""
+            def enter(*args):
+                nonlocal native_depth
+                *args, depth = args
+                promote(index)
+                if native[index] is not None:
+                    return native[index](*args, depth)
+                outer_depth, native_depth = native_depth, depth
+                result = run_nested(index, args)
+                native_depth = outer_depth
+                return result
+            return enter
+
+        def vm_call(index, *args):
+            """Runs a call from compiled code that is nested too deeply entirely in the VM."""
+            nonlocal deep
+            outer_deep, deep = deep, True
+            result = run_nested(index, args)
+            deep = outer_deep
+            return result
+
+        def memo_call(arg):
+            cache = memo_caches[arg >> opcodes.CALL_ARGC_BITS]
+            if cache is None:
+                return plain_call(arg)
+            first_arg = len(stack) - (arg & opcodes.CALL_ARGC_MASK)
+            key = memo_key(stack[first_arg:])
+            value = cache.get(key)
+            if value is not MISSING:
+                del stack[first_arg:]
+                push(value)
+                return None
+            target = plain_call(arg)
+            if target is None:
+                # Answered by compiled code without a VM frame
+                cache.put(key, stack[-1])
+            else:
+                # Tail calls keep this frame, so whatever it finally returns is the result for 'key'
+                call_stack[-1].memo = (cache, key)
+            return target
+
+        def memo_return(arg):
+            frame = call_stack[-1]
+            if frame.memo is not None:
+                frame.memo[0].put(frame.memo[1], stack[-1])
+                frame.memo = None
+            return return_(arg)
+
+        dispatch = [None] * len(opcodes.OPNAMES)
+        dispatch[opcodes.LOAD_CONST] = load_const
+        dispatch[opcodes.LOAD_FAST] = load_fast
+        dispatch[opcodes.STORE_FAST] = store_fast
+        dispatch[opcodes.LOAD_GLOBAL] = load_global
+        dispatch[opcodes.STORE_GLOBAL] = store_global
+        dispatch[opcodes.POP_TOP] = pop_top
+        dispatch[opcodes.PRINT] = print_ if output is None else print_to_output
+        for op_name, fn in BINARY_OPERATORS.items():
+            dispatch[opcodes.OPMAP[op_name]] = binary(fn, quickened_forms(op_name))
+        dispatch[opcodes.JUMP] = jump
+        dispatch[opcodes.JUMP_IF_FALSE] = jump_if_false
+        dispatch[opcodes.CALL] = call
+        dispatch[opcodes.RETURN] = return_
+        dispatch[opcodes.TAIL_CALL] = tail_call
+        dispatch[opcodes.HALT] = halt
+        dispatch[opcodes.BUILD_ARRAY] = build_array
+        dispatch[opcodes.LOAD_INDEX] = load_index
+        dispatch[opcodes.STORE_INDEX] = store_index
+        dispatch[opcodes.CALL_BUILTIN] = call_builtin
+        dispatch[opcodes.FOR_RANGE_FAST] = for_range_fast
+        dispatch[opcodes.FOR_RANGE_GLOBAL] = for_range_global
+        dispatch[opcodes.INCREMENT_FAST] = increment_fast
+        dispatch[opcodes.INCREMENT_GLOBAL] = increment_global
+        for op_name, fn in BINARY_OPERATORS.items():
+            jump_name = "JUMP_IF_NOT_" + op_name[len("BINARY_"):]
+            if jump_name in opcodes.OPMAP:
+                dispatch[opcodes.OPMAP[jump_name]] = compare_jump(fn, quickened_forms(jump_name))
+        dispatch[opcodes.BINARY_ADD_INT] = binary_add_int
+        dispatch[opcodes.BINARY_ADD_STR] = binary_add_str
+        dispatch[opcodes.BINARY_SUB_INT] = binary_sub_int
+        dispatch[opcodes.BINARY_MUL_INT] = binary_mul_int
+        dispatch[opcodes.JUMP_IF_NOT_EQ_INT] = jump_if_not_eq_int
+        dispatch[opcodes.JUMP_IF_NOT_NE_INT] = jump_if_not_ne_int
+        dispatch[opcodes.JUMP_IF_NOT_LT_INT] = jump_if_not_lt_int
+        dispatch[opcodes.JUMP_IF_NOT_GT_INT] = jump_if_not_gt_int
+        dispatch[opcodes.JUMP_IF_NOT_LE_INT] = jump_if_not_le_int
+        dispatch[opcodes.JUMP_IF_NOT_GE_INT] = jump_if_not_ge_int
+        dispatch[opcodes.CALL_EXACT_ARGS] = call_exact_args
+        if jit is not None:
+            call_counts = [0] * len(names)
+            native = [None] * len(names)
+            entries = [vm_entry(index) if func is not None else None for index, func in enumerate(functions_by_index)]
+            jit_runtime = {"G": globals_vars, "E": entries, "C": constants, "B": builtins_by_index,
+                           "UNSET": UNSET, "Array": Array,
+                           "load_global": global_value, "undefined": undefined, "vm_call": vm_call,
+                           "print": print if output is None else output.append}
+            # Depth of the compiled call that entered the VM, and whether compiled code is bypassed
+            native_depth = 0
+            deep = False
+            dispatch[opcodes.CALL] = jit_call
+        if memo is not None:
+            memo_caches = [memo.caches.get(name) if func is not None and func.pure else None
+                           for name, func in zip(names, functions_by_index)]
+            plain_call = dispatch[opcodes.CALL]
+            dispatch[opcodes.CALL] = memo_call
+            dispatch[opcodes.RETURN] = memo_return
+        if jit is not None or memo is not None:
+            # Quickened call sites must still go through the JIT or the memo cache
+            dispatch[opcodes.CALL_EXACT_ARGS] = dispatch[opcodes.CALL]
+        if limits is not None and limits.max_value_size is not None:
+            # Only these can make a value much larger than their operands
+            check_size = limits.check_size
+            max_bits = limits.max_value_size << 3
+            for op in (opcodes.BINARY_ADD, opcodes.BINARY_ADD_STR):
+                dispatch[op] = checked_result(dispatch[op])
+            for op in (opcodes.BINARY_MUL, opcodes.BINARY_MUL_INT):
+                dispatch[op] = checked_product(dispatch[op])
+            dispatch[opcodes.CALL_BUILTIN] = checked_builtin
+
+        if limits is not None:
+            # Every loop and every recursion transfers control, so counting a
+            # step only when an instruction returns a target catches them all.
+            # Only calls deepen the call stack, and statements leave the
+            # operand stack as they found it, so depth and stack are checked
+            # by the call handlers alone.
+            max_steps, max_depth, max_stack = limits.bounds()
+            for op in (opcodes.CALL, opcodes.CALL_EXACT_ARGS):
+                dispatch[op] = checked_call(dispatch[op])
+            steps = 0
+            stop = max_steps + 1
+            # The next step count that needs attention: past the limit, or the end of a slice
+            checkpoint = stop if slice_size is None else min(slice_size, stop)
+            while ip >= 0:
+                target = dispatch[code[ip]](code[ip + 1])
+                if target is None:
+                    ip += 2
                 else:
-                    globals_vars[name] = value
-
-            elif op.startswith("BINARY_"):
-                b = stack.pop()
-                a = stack.pop()
-                if op == "BINARY_ADD": stack.append(a + b)
-                elif op == "BINARY_SUB": stack.append(a - b)
-                elif op == "BINARY_MUL": stack.append(a * b)
-                elif op == "BINARY_DIV": stack.append(a // b)
-                elif op == "BINARY_EQ": stack.append(a == b)
-                elif op == "BINARY_NE": stack.append(a != b)
-                elif op == "BINARY_LT": stack.append(a < b)
-                elif op == "BINARY_GT": stack.append(a > b)
-                elif op == "BINARY_LE": stack.append(a <= b)
-                elif op == "BINARY_GE": stack.append(a >= b)
-            
-            elif op == "JUMP_IF_FALSE":
-                if not stack.pop():
-                    ip = args[0]
-            elif op == "JUMP":
-                ip = args[0]
+                    ip = target
+                    steps += 1
+                    if steps == checkpoint:
+                        if steps == stop:
+                            limits.exceeded(steps, len(call_stack), len(stack))
+                        yield
+                        checkpoint = min(steps + slice_size, stop)
+            return
 
-            elif op == "CALL":
-                name, num_args = args
-                func = self.functions.get(name)
-                if not func: raise NameError(f"function '{name}' is not defined")
-                
-                if len(func["params"]) != num_args:
-                    raise TypeError(f"function '{name}' takes {len(func['params'])} arguments but {num_args} were given")
-
-                new_frame = {
-                    "return_ip": ip,
-                    "return_bytecode": active_bytecode,
-                    "locals": {}
-                }
-                for i in range(num_args):
-                    arg_name = func["params"][num_args - 1 - i]
-                    new_frame["locals"][arg_name] = stack.pop()
-                
-                call_stack.append(new_frame)
-                active_bytecode = func["bytecode"]
-                ip = 0
-
-            elif op == "RETURN":
-                return_value = stack.pop()
-                frame = call_stack.pop()
-                active_bytecode = frame["return_bytecode"]
-                ip = frame["return_ip"]
-                stack.append(return_value)
\ No newline at end of file
+        if profiler is None and slice_size is None:
+            while ip >= 0:
+                op = code[ip]
+                target = dispatch[op](code[ip + 1])
+                ip = ip + 2 if target is None else target
+            return
+
+        if profiler is None:
+            budget = slice_size
+            while ip >= 0:
+                op = code[ip]
+                target = dispatch[op](code[ip + 1])
+                ip = ip + 2 if target is None else target
+                budget -= 1
+                if not budget:
+                    budget = slice_size
+                    yield
+            return
+
+        clock = profiler.clock
+        specialized_from = opcodes.SPECIALIZED_FROM
+        main_code = self.main_code
+        profiler.enter(main_code.name)
+        try:
+            while ip >= 0:
+                op = code[ip]
+                lines = (call_stack[-1].function if call_stack else main_code).lines
+                start = clock()
+                target = dispatch[op](code[ip + 1])
+                profiler.instruction(op, lines[ip >> 1] if lines else None, clock() - start)
+                op = specialized_from.get(op, op)
+                if op == opcodes.CALL and target is not None:
+                    # A memoized call that hit the cache pushed no frame
+                    profiler.enter(call_stack[-1].function.name)
+                elif op == opcodes.RETURN:
+                    profiler.exit()
+                elif op == opcodes.TAIL_CALL:
+                    profiler.exit()
+                    profiler.enter(call_stack[-1].function.name)
+                ip = ip + 2 if target is None else target
+        finally:
+            profiler.unwind()
@@ -1,8 +1,28 @@
+import operator
+
+from arrays import Array
+from limits import LimitExceeded, Meter
+from memoization import MISSING, memo_key
+from stdlib import BUILTINS
+
+BINARY_OPERATORS = {
+    "add": operator.add, "sub": operator.sub, "mult": operator.mul, "div": operator.floordiv,
+    "eq": operator.eq, "ne": operator.ne, "lt": operator.lt, "gt": operator.gt,
+    "le": operator.le, "ge": operator.ge,
+}
+
 class ReturnSignal(Exception):
     """A special exception used to handle 'return' statements."""
     def __init__(self, value):
         self.value = value
 
+class TailCall(Exception):
+    """Raised by 'return f(...)' so the running call reuses its Python frame for f."""
+    def __init__(self, func_name, callee, args):
+        self.func_name = func_name
+        self.callee = callee
+        self.args = args
+
 class Environment:
     """Manages a scope for variables, with a reference to a parent scope."""
     def __init__(self, parent=None):
@@ -31,6 +51,68 @@ class Environment:
             return self.parent.lookup(name)
         raise NameError(f"Variable '{name}' is not defined.")
 
+UNSET = object()
+
+# Set by profile() for the duration of a profiled run
+profiler = None
+
+# A memoization.MemoTable; calls to the functions it has caches for are memoized
+memo = None
+
+# Set by metered() for the duration of a metered run: a limits.Meter, and
+# the operator table, whose '+' and '*' then check the size of their results
+meter = None
+operators = BINARY_OPERATORS
+
+class SlotEnvironment:
+    """
+    Array-backed scope for programs rewritten by resolver.resolve().
+    Variables live in fixed slots addressed by (depth, slot) pairs.
+    """
+    __slots__ = ("slots", "parent")
+
+    def __init__(self, size, parent=None):
+        self.slots = [UNSET] * size
+        self.parent = parent
+
+    def load(self, addresses, name):
+        """Reads the first written slot among the resolver's candidate addresses."""
+        for depth, slot in addresses:
+            env = self
+            for _ in range(depth):
+                env = env.parent
+            value = env.slots[slot]
+            if value is not UNSET:
+                return value
+        raise NameError(f"Variable '{name}' is not defined.")
+
+def _check_callable(func_name, callee):
+    if not isinstance(callee, tuple) or callee[0] != "function":
+        raise TypeError(f"'{func_name}' is not a function.")
+
+def _call_builtin(func_name, arg_nodes, env):
+    if meter is not None:
+        return meter.limits.call_builtin(BUILTINS[func_name], [interpret(arg, env) for arg in arg_nodes])
+    return BUILTINS[func_name](*[interpret(arg, env) for arg in arg_nodes])
+
+def _lookup_callee(func_name, env):
+    """Looks up a called name; returns None for a builtin that the program does not shadow."""
+    try:
+        return env.lookup(func_name)
+    except NameError:
+        if func_name in BUILTINS:
+            return None
+        raise
+
+def _load_callee(func_name, addresses, env):
+    """Loads a called slot; returns None for a builtin whose shadowing definition has not run yet."""
+    try:
+        return env.load(addresses, func_name)
+    except NameError:
+        if func_name in BUILTINS:
+            return None
+        raise
+
 def interpret(ast, env=None):
     """
     Executes an AST directly using a tree-walking interpreter approach.
@@ -42,52 +124,38 @@ def interpret(ast, env=None):
     Returns:
         The result of the evaluated expression, or None for statements.
     """
-    if env is None:
-        env = Environment()
-
     cmd = ast[0]
 
-    if cmd == "program":
-        result = None
-        for stmt in ast[1]:
-            result = interpret(stmt, env)
-        return result
-
-    elif cmd == "block":
-        for stmt in ast[1]:
-            interpret(stmt, env)
-
-    elif cmd == "assign":
-        var_name = ast[1]
-        value = interpret(ast[2], env)
-        env.define(var_name, value)
+    if env is None:
+        env = SlotEnvironment(len(ast[1])) if cmd == "resolved_program" else Environment()
 
-    elif cmd == "print":
-        value = interpret(ast[1], env)
-        print(value)
+    # The most frequent nodes of resolved programs come first.
+    if cmd == "load_local":
+        value = env.slots[ast[2]]
+        if value is UNSET:
+            raise NameError(f"Variable '{ast[1]}' is not defined.")
+        return value
 
     elif cmd == "number":
         return ast[1]
 
-    elif cmd == "string":
-        return ast[1][1:-1]
+    elif cmd in operators:
+        return operators[cmd](interpret(ast[1], env), interpret(ast[2], env))
 
-    elif cmd == "variable":
-        return env.lookup(ast[1])
+    elif cmd == "load_slot":
+        return env.load(ast[2], ast[1])
+
+    elif cmd == "store_slot":
+        env.slots[ast[2]] = interpret(ast[3], env)
 
-    elif cmd in ("add", "sub", "mult", "div", "eq", "ne", "lt", "gt", "le", "ge"):
-        left = interpret(ast[1], env)
-        right = interpret(ast[2], env)
-        if cmd == "add": return left + right
-        if cmd == "sub": return left - right
-        if cmd == "mult": return left * right
-        if cmd == "div": return left // right
-        if cmd == "eq": return left == right
-        if cmd == "ne": return left != right
-        if cmd == "lt": return left < right
-        if cmd == "gt": return left > right
-        if cmd == "le": return left <= right
-        if cmd == "ge": return left >= right
+    elif cmd == "line":
+        if profiler is not None:
+            profiler.line(ast[1])
+        return interpret(ast[2], env)
+
+    elif cmd == "block":
+        for stmt in ast[1]:
+            interpret(stmt, env)
 
     elif cmd == "if":
         condition = interpret(ast[1], env)
@@ -99,40 +167,166 @@ def interpret(ast, env=None):
     elif cmd == "while":
         while interpret(ast[1], env):
             interpret(ast[2], env)
+            if meter is not None:
+                meter.step()
 
-    elif cmd == "function":
-        name, params, body = ast[1], ast[2], ast[3]
-        env.define(name, ("function", params, body, env))
-
-    elif cmd == "call":
+    elif cmd == "call_slot" or cmd == "call":
+        # The call runs in this frame, not in a helper, so every level of
+        # NotP recursion costs as few Python frames as possible. Tail calls
+        # raised by the body run in the same loop, so chains of
+        # 'return f(...)' use constant Python stack.
         func_name = ast[1]
-        callee = env.lookup(func_name)
-        
-        if not isinstance(callee, tuple) or callee[0] != "function":
-            raise TypeError(f"'{func_name}' is not a function.")
+        if cmd == "call_slot":
+            callee, arg_nodes = _load_callee(func_name, ast[2], env), ast[3]
+        else:
+            callee, arg_nodes = _lookup_callee(func_name, env), ast[2]
+        if callee is None:
+            return _call_builtin(func_name, arg_nodes, env)
+        _check_callable(func_name, callee)
+        args = [interpret(arg, env) for arg in arg_nodes]
 
-        _, params, body, definition_env = callee
-        args = [interpret(arg, env) for arg in ast[2]]
+        cache = None
+        if memo is not None:
+            cache = memo.caches.get(func_name)
+            if cache is not None:
+                key = memo_key(args)
+                value = cache.get(key)
+                if value is not MISSING:
+                    return value
 
-        if len(params) != len(args):
-            raise TypeError(f"Function '{func_name}' expects {len(params)} arguments, but got {len(args)}.")
+        while True:
+            _, params, body, definition_env = callee
+            if len(params) != len(args):
+                raise TypeError(f"Function '{func_name}' expects {len(params)} arguments, but got {len(args)}.")
 
-        call_env = Environment(parent=definition_env)
-        for param_name, arg_value in zip(params, args):
-            call_env.define(param_name, arg_value)
+            if body[0] == "scope":
+                _, names, param_slots, body = body
+                call_env = SlotEnvironment(len(names), parent=definition_env)
+                for slot, arg_value in zip(param_slots, args):
+                    call_env.slots[slot] = arg_value
+            else:
+                call_env = Environment(parent=definition_env)
+                for param_name, arg_value in zip(params, args):
+                    call_env.define(param_name, arg_value)
 
-        try:
-            interpret(body, call_env)
-            return None
-        except ReturnSignal as ret:
-            return ret.value
+            if profiler is not None:
+                profiler.enter(func_name)
+            if meter is not None:
+                meter.enter()
+            try:
+                interpret(body, call_env)
+                value = None
+                break
+            except ReturnSignal as ret:
+                value = ret.value
+                break
+            except TailCall as tail:
+                func_name, callee, args = tail.func_name, tail.callee, tail.args
+                if meter is not None:
+                    meter.exit()
+            finally:
+                if profiler is not None:
+                    profiler.exit()
+
+        # Not in the finally clause: an error ends a metered run, and metered()
+        # reads the depth it reached
+        if meter is not None:
+            meter.exit()
+        if cache is not None:
+            cache.put(key, value)
+        return value
+
+    elif cmd == "call_builtin":
+        return _call_builtin(ast[1], ast[2], env)
 
     elif cmd == "return":
+        value = ast[1]
+        if value[0] == "call" or value[0] == "call_slot":
+            func_name = value[1]
+            if value[0] == "call":
+                callee, arg_nodes = _lookup_callee(func_name, env), value[2]
+            else:
+                callee, arg_nodes = _load_callee(func_name, value[2], env), value[3]
+            if callee is None:
+                raise ReturnSignal(_call_builtin(func_name, arg_nodes, env))
+            _check_callable(func_name, callee)
+            raise TailCall(func_name, callee, [interpret(arg, env) for arg in arg_nodes])
+        raise ReturnSignal(interpret(value, env))
+
+    elif cmd == "variable":
+        return env.lookup(ast[1])
+
+    elif cmd == "assign":
+        var_name = ast[1]
+        value = interpret(ast[2], env)
+        env.define(var_name, value)
+
+    elif cmd == "string":
+        return ast[1][1:-1]
+
+    elif cmd == "print":
         value = interpret(ast[1], env)
-        raise ReturnSignal(value)
+        print(value)
 
     elif cmd == "expression_statement":
         return interpret(ast[1], env)
 
+    elif cmd == "index":
+        return interpret(ast[1], env)[interpret(ast[2], env)]
+
+    elif cmd == "store_index":
+        target = interpret(ast[1], env)
+        index = interpret(ast[2], env)
+        target[index] = interpret(ast[3], env)
+
+    elif cmd == "array":
+        return Array([interpret(element, env) for element in ast[1]])
+
+    elif cmd == "function":
+        name, params, body = ast[1], ast[2], ast[3]
+        env.define(name, ("function", params, body, env))
+
+    elif cmd == "define_function":
+        env.slots[ast[2]] = ("function", ast[3], ast[4], env)
+
+    elif cmd == "program":
+        result = None
+        for stmt in ast[1]:
+            result = interpret(stmt, env)
+        return result
+
+    elif cmd == "resolved_program":
+        result = None
+        for stmt in ast[2]:
+            result = interpret(stmt, env)
+        return result
+
     else:
-        raise RuntimeError(f"Unknown AST node type: {cmd}")
\ No newline at end of file
+        raise RuntimeError(f"Unknown AST node type: {cmd}")
+
+def profile(ast, active_profiler, env=None):
+    """Interprets 'ast' while reporting function calls and line events to 'active_profiler'."""
+    global profiler
+    profiler = active_profiler
+    active_profiler.enter("<main>")
+    try:
+        return interpret(ast, env)
+    finally:
+        active_profiler.unwind()
+        profiler = None
+
+def metered(ast, limits, env=None):
+    """Interprets 'ast' under limits.Limits, raising limits.LimitExceeded once the run goes past them."""
+    global meter, operators
+    meter = Meter(limits)
+    if limits.max_value_size is not None:
+        operators = dict(BINARY_OPERATORS, add=limits.add, mult=limits.multiply)
+    try:
+        return interpret(ast, env)
+    except RecursionError:
+        # Each NotP call takes several Python frames, so Python's own stack
+        # can run out below max_depth. That is the depth this run can reach.
+        raise LimitExceeded("depth", meter.depth) from None
+    finally:
+        meter = None
+        operators = BINARY_OPERATORS
@@ -0,0 +1,296 @@
+"""
+Second execution tier for the VM: hot functions are translated to Python.
+
+Compiler.run(jit=Jit(...)) counts calls per function. When a function
+reaches the threshold, translate() turns its assembled bytecode into the
+source of a Python function. That source is compiled with compile(), and
+the VM calls the result directly from then on. Each basic block becomes
+a branch of a 'pc' state machine, and stack operations within a block
+become nested Python expressions. A function using anything translate()
+does not handle stays in the VM.
+
+Compiled code calls other functions through the runtime's 'E' list.
+Each entry is either a compiled function or a stub that runs the callee
+in the VM. Every entry takes the current call depth as an extra last
+argument. Past MAX_NATIVE_DEPTH, a compiled function hands its call to
+the VM ('vm_call'), which finishes that subtree without using the Python
+stack. Deep recursion therefore works as it does in the plain VM.
+"""
+
+import sys
+
+import opcodes
+
+DEFAULT_THRESHOLD = 50
+
+# Nested calls that may run as Python frames before the VM takes over.
+# Several Python frames per level when compiled and VM code alternate must still fit the default recursion limit.
+MAX_NATIVE_DEPTH = 100
+
+OPERATORS = {
+    opcodes.BINARY_ADD: "+", opcodes.BINARY_SUB: "-", opcodes.BINARY_MUL: "*", opcodes.BINARY_DIV: "//",
+    opcodes.BINARY_EQ: "==", opcodes.BINARY_NE: "!=", opcodes.BINARY_LT: "<", opcodes.BINARY_GT: ">",
+    opcodes.BINARY_LE: "<=", opcodes.BINARY_GE: ">=",
+}
+
+COMPARE_JUMPS = {
+    opcodes.JUMP_IF_NOT_EQ: "==", opcodes.JUMP_IF_NOT_NE: "!=", opcodes.JUMP_IF_NOT_LT: "<",
+    opcodes.JUMP_IF_NOT_GT: ">", opcodes.JUMP_IF_NOT_LE: "<=", opcodes.JUMP_IF_NOT_GE: ">=",
+}
+
+# Names bound by the factory that wraps every translated function.
+# 'print' is rebound so Compiler.run(output=...) also captures compiled code's output.
+RUNTIME_NAMES = ("G", "E", "C", "B", "UNSET", "Array", "load_global", "undefined", "vm_call", "print")
+
+LITERAL_TYPES = (int, str, bool, type(None))
+
+
+class Unsupported(Exception):
+    """Raised by translate() for bytecode it cannot turn into Python."""
+
+
+def _leaders(instructions):
+    """Returns the sorted instruction indices that start a basic block."""
+    leaders = {0}
+    for index, (op, arg) in enumerate(instructions):
+        if op in opcodes.HAS_JUMP:
+            leaders.add(arg >> 1)
+            leaders.add(index + 1)
+        elif op in opcodes.HAS_LOOP:
+            leaders.add((arg & opcodes.LOOP_TARGET_MASK) >> 1)
+            leaders.add(index + 1)
+        elif op in (opcodes.RETURN, opcodes.TAIL_CALL, opcodes.HALT):
+            leaders.add(index + 1)
+    return sorted(leader for leader in leaders if leader < len(instructions))
+
+
+class _Block:
+    """Symbolic stack and emitted lines for one basic block."""
+
+    def __init__(self):
+        self.lines = []
+        # (expression, stable): stable entries are literals or temporaries that later statements cannot change
+        self.stack = []
+        self.temps = 0
+
+    def push(self, expression, stable=False):
+        self.stack.append((expression, stable))
+
+    def pop(self):
+        if not self.stack:
+            raise Unsupported("stack underflow")
+        return self.stack.pop()[0]
+
+    def flush(self):
+        """Evaluates pending expressions into temporaries before a statement with side effects."""
+        for position, (expression, stable) in enumerate(self.stack):
+            if not stable:
+                temp = f"t{self.temps}"
+                self.temps += 1
+                self.lines.append(f"{temp} = {expression}")
+                self.stack[position] = (temp, True)
+
+    def emit(self, line):
+        self.flush()
+        self.lines.append(line)
+
+
+def translate(func, constants, names, functions_by_index):
+    """
+    Returns Python source for a factory taking RUNTIME_NAMES and returning
+    'func' as a Python function, or raises Unsupported.
+    """
+    code = opcodes.generic_code(func.code)
+    instructions = [(code[i], code[i + 1]) for i in range(0, len(code), 2)]
+    own_index = names.index(func.name)
+    num_params = len(func.params)
+    local_names = func.local_names
+
+    def load_fast(slot):
+        if slot < num_params:
+            return f"l{slot}"
+        name = local_names[slot]
+        fallback = f"load_global({names.index(name)})" if name in names else f"undefined({name!r})"
+        return f"(l{slot} if l{slot} is not UNSET else {fallback})"
+
+    def load_global(index):
+        return f"(G[{index}] if G[{index}] is not UNSET else load_global({index}))"
+
+    def call(block, arg):
+        index, num_args = arg >> opcodes.CALL_ARGC_BITS, arg & opcodes.CALL_ARGC_MASK
+        callee = functions_by_index[index] if index < len(functions_by_index) else None
+        # Calls the VM would reject stay in the VM, which raises the right error.
+        if callee is None or len(callee.params) != num_args:
+            raise Unsupported(f"call to '{names[index]}' does not match a function")
+        args = [block.pop() for _ in range(num_args)][::-1]
+        return index, args
+
+    leaders = _leaders(instructions)
+    bounds = list(zip(leaders, leaders[1:] + [len(instructions)]))
+    body = []
+    # Without backward jumps every block runs at most once, so the 'while' is left out.
+    loops = False
+    for start, end in bounds:
+        block = _Block()
+        terminated = False
+        for op, arg in instructions[start:end]:
+            if op == opcodes.LOAD_CONST:
+                value = constants[arg]
+                block.push(repr(value) if type(value) in LITERAL_TYPES else f"C[{arg}]", stable=True)
+            elif op == opcodes.LOAD_FAST:
+                block.push(load_fast(arg))
+            elif op == opcodes.STORE_FAST:
+                value = block.pop()
+                block.emit(f"l{arg} = {value}")
+            elif op == opcodes.LOAD_GLOBAL:
+                block.push(load_global(arg))
+            elif op == opcodes.STORE_GLOBAL:
+                value = block.pop()
+                block.emit(f"G[{arg}] = {value}")
+            elif op == opcodes.POP_TOP:
+                value = block.pop()
+                block.emit(value)
+            elif op == opcodes.PRINT:
+                value = block.pop()
+                block.emit(f"print({value})")
+            elif op in OPERATORS:
+                right = block.pop()
+                left = block.pop()
+                block.push(f"({left} {OPERATORS[op]} {right})")
+            elif op == opcodes.INCREMENT_FAST:
+                slot = arg >> opcodes.INCREMENT_BITS
+                step = (arg & opcodes.INCREMENT_MASK) + opcodes.INCREMENT_MIN
+                block.emit(f"l{slot} = {load_fast(slot)} + {step}")
+            elif op == opcodes.INCREMENT_GLOBAL:
+                index = arg >> opcodes.INCREMENT_BITS
+                step = (arg & opcodes.INCREMENT_MASK) + opcodes.INCREMENT_MIN
+                block.emit(f"G[{index}] = {load_global(index)} + {step}")
+            elif op == opcodes.CALL:
+                index, args = call(block, arg)
+                block.push(f"E[{index}]({', '.join(args + ['depth + 1'])})")
+            elif op == opcodes.CALL_BUILTIN:
+                args = [block.pop() for _ in range(arg & opcodes.CALL_ARGC_MASK)][::-1]
+                block.push(f"B[{arg >> opcodes.CALL_ARGC_BITS}]({', '.join(args)})")
+            elif op == opcodes.BUILD_ARRAY:
+                elements = [block.pop() for _ in range(arg)][::-1]
+                block.push(f"Array([{', '.join(elements)}])")
+            elif op == opcodes.LOAD_INDEX:
+                index = block.pop()
+                target = block.pop()
+                block.push(f"{target}[{index}]")
+            elif op == opcodes.STORE_INDEX:
+                # Python would evaluate the value before the target and index
+                block.flush()
+                value = block.pop()
+                index = block.pop()
+                target = block.pop()
+                block.emit(f"{target}[{index}] = {value}")
+            elif op == opcodes.RETURN:
+                value = block.pop()
+                block.emit(f"return {value}")
+                terminated = True
+            elif op == opcodes.TAIL_CALL:
+                index, args = call(block, arg)
+                if index != own_index:
+                    # Python has no tail calls; chains like even/odd would exhaust its stack
+                    raise Unsupported(f"tail call to '{names[index]}'")
+                # Self tail call: rebind the parameters and restart the loop
+                if num_params:
+                    block.emit(f"{', '.join(f'l{slot}' for slot in range(num_params))}, = {', '.join(args)},")
+                block.lines.extend(f"l{slot} = UNSET" for slot in range(num_params, len(local_names)))
+                block.lines.extend(("pc = 0", "continue"))
+                loops = terminated = True
+            elif op in (opcodes.JUMP, opcodes.JUMP_IF_FALSE) or op in COMPARE_JUMPS:
+                if op == opcodes.JUMP_IF_FALSE:
+                    condition = block.pop()
+                elif op in COMPARE_JUMPS:
+                    right = block.pop()
+                    left = block.pop()
+                    condition = f"{left} {COMPARE_JUMPS[op]} {right}"
+                else:
+                    condition = None
+                block.flush()
+                target = arg >> 1
+                if condition is None:
+                    block.lines.append(f"pc = {target}")
+                    if target <= start:
+                        block.lines.append("continue")
+                        loops = True
+                    terminated = True
+                elif target <= start:
+                    block.lines.append(f"if not ({condition}):")
+                    block.lines.append(f"    pc = {target}")
+                    block.lines.append("    continue")
+                    loops = True
+                else:
+                    block.lines.append(f"pc = {end} if ({condition}) else {target}")
+                    terminated = True
+            elif op in opcodes.HAS_LOOP:
+                # Step the counter, then jump back to the top of the loop while it is below the limit
+                counter, limit, step, inclusive = constants[arg >> opcodes.LOOP_TARGET_BITS]
+                if op == opcodes.FOR_RANGE_FAST:
+                    block.emit(f"l{counter} = {load_fast(counter)} + {step}")
+                    counter, limit = f"l{counter}", f"l{limit}"
+                else:
+                    block.emit(f"G[{counter}] = G[{counter}] + {step}")
+                    counter, limit = f"G[{counter}]", f"G[{limit}]"
+                block.lines.append(f"if {counter} {'<=' if inclusive else '<'} {limit}:")
+                block.lines.append(f"    pc = {(arg & opcodes.LOOP_TARGET_MASK) >> 1}")
+                block.lines.append("    continue")
+                loops = True
+            else:
+                raise Unsupported(f"opcode {opcodes.OPNAMES[op]}")
+        if block.stack:
+            raise Unsupported("values left on the stack between blocks")
+        if not terminated:
+            if end == len(instructions):
+                raise Unsupported("falls off the end of the function")
+            block.lines.append(f"pc = {end}")
+        body.append((start, block.lines))
+
+    params = [f"l{slot}" for slot in range(num_params)]
+    source = [f"def make({', '.join(RUNTIME_NAMES)}):",
+              f"    def notp_{func.name}({', '.join(params + ['depth'])}):",
+              f"        if depth > {MAX_NATIVE_DEPTH}:",
+              f"            return vm_call({', '.join([str(own_index)] + params)})"]
+    if len(local_names) > num_params:
+        source.append(f"        {' = '.join(f'l{slot}' for slot in range(num_params, len(local_names)))} = UNSET")
+    source.append("        pc = 0")
+    indent = "        "
+    if loops:
+        source.append("        while True:")
+        indent += "    "
+    for start, lines in body:
+        source.append(f"{indent}if pc == {start}:")
+        source.extend(f"{indent}    {line}" for line in lines)
+    source.append(f"    return notp_{func.name}")
+    return "\n".join(source) + "\n"
+
+
+class Jit:
+    """Tiering policy and bookkeeping for Compiler.run(jit=...)."""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        # Function name -> generated Python source
+        self.compiled = {}
+        # Function name -> why it stayed in the VM
+        self.rejected = {}
+
+    def compile(self, func, compiler, runtime):
+        """Returns a Python function for 'func' bound to 'runtime', or None if it must stay in the VM."""
+        try:
+            source = translate(func, compiler.constants, compiler.names, compiler.functions_by_index)
+        except Unsupported as reason:
+            self.rejected[func.name] = str(reason)
+            return None
+        namespace = {}
+        exec(compile(source, f"<jit {func.name}>", "exec"), namespace)
+        self.compiled[func.name] = source
+        return namespace["make"](*(runtime[name] for name in RUNTIME_NAMES))
+
+    def report(self, out=sys.stderr):
+        for name in sorted(self.compiled):
+            print(f"jit {name}: compiled", file=out)
+        for name, reason in sorted(self.rejected.items()):
+            print(f"jit {name}: kept in the VM ({reason})", file=out)
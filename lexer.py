@@ -1,14 +1,18 @@
+import mmap
+import os
 import re
+import sys
+from collections import deque
 
 TOKEN_SPEC = [
     # --- Ignored Tokens ---
     ("COMMENT", r"//.*"),
-    ("SKIP", r"[ \t]+"),
+    ("SKIP", r"[ \t\r]+"),
     ("NEWLINE", r"\n"),
 
     # --- Literals ---
     ("NUMBER", r"\d+"),
-    ("STRING", r'"([^"\\]|\\.)*"'),
+    ("STRING", r'"(?:[^"\\]|\\.)*"'),
 
     # --- Keywords ---
     ("PRINT", r"print\b"),
@@ -38,6 +42,8 @@ TOKEN_SPEC = [
     ("RPAREN", r"\)"),
     ("LBRACE", r"\{"),
     ("RBRACE", r"\}"),
+    ("LBRACKET", r"\["),
+    ("RBRACKET", r"\]"),
     ("COMMA", r","),
 
     # --- Identifiers ---
@@ -48,28 +54,104 @@ TOKEN_SPEC = [
 ]
 
 
-TOKEN_REGEXES = [(token_type, re.compile(pattern)) for token_type, pattern in TOKEN_SPEC]
+TRIVIA = frozenset(("SKIP", "COMMENT", "NEWLINE"))
+
+# One alternation of named groups. The alternatives keep the order of
+# TOKEN_SPEC, so keywords still win over identifiers and "==" over "=".
+MASTER_REGEX = re.compile("|".join(f"(?P<{token_type}>{pattern})" for token_type, pattern in TOKEN_SPEC))
+MASTER_REGEX_BYTES = re.compile(MASTER_REGEX.pattern.encode("ascii"))
+
+
+def _scan(source, regex, keep_trivia, decode):
+    """
+    Shared scanning loop for str and bytes-like sources. Columns count
+    characters either way: non-ASCII text can only occur in strings and
+    comments, so a bytes source corrects its columns after those tokens.
+    """
+    line = 1
+    line_start = 0
+    # Bytes minus characters in the current line so far
+    shift = 0
+    for match in regex.finditer(source):
+        token_type = match.lastgroup
+        start = match.start()
+        if token_type == "NEWLINE":
+            if keep_trivia:
+                yield (token_type, "\n", line, start - line_start - shift + 1)
+            line += 1
+            line_start = start + 1
+            shift = 0
+            continue
+        if token_type == "MISMATCH":
+            # A bytes source matches one byte of a multi-byte character
+            text = decode(source[start:start + 4])[:1]
+            raise RuntimeError(f"Unexpected character: {text} at line {line}, column {start - line_start - shift + 1}")
+        if token_type in TRIVIA and not keep_trivia:
+            continue
+        text = decode(match.group())
+        if token_type == "ID":
+            # Every occurrence of a name shares one string object
+            text = sys.intern(text)
+        yield (token_type, text, line, start - line_start - shift + 1)
+        if token_type == "STRING" or token_type == "COMMENT":
+            shift += match.end() - start - len(text)
+
+
+def tokenize(code, keep_trivia=False):
+    """
+    Lazily scans a string of source code.
+    Yields (type, text, line, col) tuples; lines and columns start at 1.
+    """
+    return _scan(code, MASTER_REGEX, keep_trivia, lambda text: text)
+
+
+def _scan_file(f, keep_trivia):
+    with f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            yield from _scan(source, MASTER_REGEX_BYTES, keep_trivia, lambda text: text.decode("utf-8", "replace"))
+
+
+def tokenize_file(path, keep_trivia=False):
+    """
+    Lazily scans a source file through a read-only memory map, so the
+    file is never loaded into memory as a whole. The file is opened
+    immediately, so a missing path raises here rather than on first use.
+    """
+    return _scan_file(open(path, "rb"), keep_trivia)
+
 
 def lexer(code):
     """
     Converts a string of source code into a list of tokens.
     """
-    tokens = []
-    index = 0
-    match_found = False
-    while index < len(code):
-        match_found = False
-        for token_type, regex in TOKEN_REGEXES:
-            match = regex.match(code, index)
-            if match:
-                text = match.group(0)
-                if token_type not in ("SKIP", "COMMENT", "NEWLINE"):
-                    if token_type == "MISMATCH":
-                        raise RuntimeError(f"Unexpected character: {text}")
-                    tokens.append((token_type, text))
-                index = match.end(0)
-                match_found = True
-                break
-        if not match_found:
-            raise RuntimeError(f"Lexer got stuck at index {index}")
-    return tokens
\ No newline at end of file
+    return list(tokenize(code))
+
+
+class TokenStream:
+    """
+    Cursor over a token iterable. Trivia is filtered out once as tokens
+    are pulled from the source, and lookahead is served from a small buffer.
+    """
+    def __init__(self, tokens):
+        self._source = (token for token in tokens if token[0] not in TRIVIA)
+        self._buffer = deque()
+
+    def peek(self, k=0):
+        """Returns the k-th upcoming token without consuming it, or None at end of input."""
+        buffer = self._buffer
+        if len(buffer) > k:
+            return buffer[k]
+        while len(buffer) <= k:
+            token = next(self._source, None)
+            if token is None:
+                return None
+            buffer.append(token)
+        return buffer[k]
+
+    def next(self):
+        """Consumes and returns the next token, or None at end of input."""
+        if self._buffer:
+            return self._buffer.popleft()
+        return next(self._source, None)
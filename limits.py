@@ -0,0 +1,174 @@
+"""
+Execution limits for untrusted NotP programs.
+
+A Limits object caps one run of the VM (Compiler.run(limits=...)) or of the
+tree interpreter (interpreter.metered()):
+
+    max_steps       steps: taken jumps, calls and returns in the VM; loop
+                    iterations and calls in the interpreter
+    max_depth       nested calls
+    max_stack       VM operand stack entries
+    max_value_size  approximate bytes in one value: 1 per string character,
+                    an integer's magnitude in bytes, and for an array the
+                    sizes of its elements, at least 8 each, nested arrays included
+
+None leaves a limit off. Going past a limit raises LimitExceeded, which
+ends the run and can be caught like any other error. The interpreter also
+runs out of Python stack after a few hundred nested calls. That ends the
+run with LimitExceeded("depth") too, reporting the depth it reached.
+
+The checks stay off the per-instruction path. Steps are counted only when
+control moves (a jump, call or return), since every loop and every
+recursion has to move it; straight-line code between two steps is no
+longer than the program. Depth and stack are checked on calls, the only
+instructions that grow them without bound. Sizes are checked only by the
+operations that can make a value much larger than their operands: '+' on
+strings and arrays, '*' and builtin calls.
+"""
+
+import sys
+from array import array
+
+from arrays import Array, fill
+
+UNLIMITED = sys.maxsize
+
+
+class LimitExceeded(RuntimeError):
+    """Raised when a metered run goes past one of its Limits."""
+
+    def __init__(self, limit, maximum):
+        super().__init__(f"{limit} limit of {maximum} exceeded")
+        # "step", "depth", "stack" or "value size"
+        self.limit = limit
+        self.maximum = maximum
+
+
+def value_size(value):
+    """Approximate size of a value in bytes, as counted by max_value_size."""
+    kind = type(value)
+    if kind is str:
+        return len(value)
+    if kind is int:
+        return value.bit_length() >> 3
+    if kind is Array:
+        data = value.data
+        if type(data) is array:
+            return len(data) << 3
+        return sum([max(value_size(element), 8) for element in data])
+    return 0
+
+
+def _largest(value):
+    """The element of an array with the largest size; a value that is not an array stands for itself."""
+    if type(value) is not Array:
+        return value
+    data = value.data
+    if not data:
+        return 0
+    if type(data) is array:
+        return max(max(data), -min(data))
+    return max(data, key=value_size)
+
+
+def product_size(left, right):
+    """Size of left * right, estimated without computing it."""
+    if type(left) is int and type(right) is int:
+        return (left.bit_length() + right.bit_length()) >> 3
+    if type(left) is str and type(right) is int:
+        return len(left) * max(right, 0)
+    if type(left) is int and type(right) is str:
+        return len(right) * max(left, 0)
+    if type(left) is Array or type(right) is Array:
+        # Element-wise: no element of the result is larger than the product of the largest operands
+        count = len(left) if type(left) is Array else len(right)
+        return count * max(product_size(_largest(left), _largest(right)), 8)
+    return max(value_size(left), value_size(right))
+
+
+class Limits:
+    """The caps for a metered run. One instance can be shared by any number of runs."""
+    __slots__ = ("max_steps", "max_depth", "max_stack", "max_value_size")
+
+    def __init__(self, max_steps=None, max_depth=None, max_stack=None, max_value_size=None):
+        self.max_steps = max_steps
+        self.max_depth = max_depth
+        self.max_stack = max_stack
+        self.max_value_size = max_value_size
+
+    def __repr__(self):
+        return (f"Limits(max_steps={self.max_steps}, max_depth={self.max_depth}, "
+                f"max_stack={self.max_stack}, max_value_size={self.max_value_size})")
+
+    def bounds(self):
+        """Returns (max_steps, max_depth, max_stack) as ints; an unset limit is UNLIMITED."""
+        return tuple(UNLIMITED if limit is None else limit
+                     for limit in (self.max_steps, self.max_depth, self.max_stack))
+
+    def exceeded(self, steps, depth, stack):
+        """Raises LimitExceeded for whichever of the counts is over its limit."""
+        max_steps, max_depth, max_stack = self.bounds()
+        if steps > max_steps:
+            raise LimitExceeded("step", max_steps)
+        if depth > max_depth:
+            raise LimitExceeded("depth", max_depth)
+        if stack > max_stack:
+            raise LimitExceeded("stack", max_stack)
+
+    def check_size(self, size):
+        if self.max_value_size is not None and size > self.max_value_size:
+            raise LimitExceeded("value size", self.max_value_size)
+
+    def check_builtin(self, function, args):
+        """Checks, before the call, a builtin that builds a value from a count (fill)."""
+        if function is fill and len(args) == 2 and type(args[0]) is int:
+            self.check_size(args[0] * max(value_size(args[1]), 8))
+
+    def add(self, left, right):
+        result = left + right
+        # A sum of integers is at most one bit longer than its operands
+        if type(result) is not int:
+            self.check_size(value_size(result))
+        return result
+
+    def multiply(self, left, right):
+        if type(left) is int and type(right) is int:
+            if self.max_value_size is not None and (left.bit_length() + right.bit_length()) >> 3 > self.max_value_size:
+                raise LimitExceeded("value size", self.max_value_size)
+        else:
+            self.check_size(product_size(left, right))
+        return left * right
+
+    def call_builtin(self, function, args):
+        self.check_builtin(function, args)
+        result = function(*args)
+        self.check_size(value_size(result))
+        return result
+
+
+class Meter:
+    """Step and depth counters for a metered tree-interpreter run."""
+    __slots__ = ("limits", "steps", "depth", "max_steps", "max_depth")
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.steps = 0
+        self.depth = 0
+        self.max_steps, self.max_depth, _ = limits.bounds()
+
+    def step(self):
+        self.steps += 1
+        if self.steps > self.max_steps:
+            raise LimitExceeded("step", self.max_steps)
+
+    def enter(self):
+        """Counts a call as a step and one more level of nesting."""
+        self.steps += 1
+        if self.steps > self.max_steps:
+            raise LimitExceeded("step", self.max_steps)
+        self.depth += 1
+        if self.depth > self.max_depth:
+            raise LimitExceeded("depth", self.max_depth)
+
+    def exit(self):
+        self.depth -= 1
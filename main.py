@@ -1,38 +1,226 @@
+import argparse
+import json
+import os
+import subprocess
 import sys
-from lexer import lexer
+import tempfile
+from lexer import tokenize_file
 from parser import Parser
 from compiler import Compiler
-from interpreter import interpret
+import interpreter
+from interpreter import interpret, metered, profile
+from resolver import resolve
+from closure_compiler import compile_closures
+import stack_interpreter
+from optimizer import optimize
+from profiler import Profiler
+from memoization import DEFAULT_MAXSIZE, MemoTable, find_pure_functions
+from jit import DEFAULT_THRESHOLD, Jit
+import native_compiler
+import bytecode_cache
+import batch
+from limits import LimitExceeded, Limits
+
+def compile_for_vm(filepath, args):
+    """Returns an assembled Compiler, from the .notpc cache when it is still valid."""
+    digest = path = None
+    # Cached bytecode has no line table, so profiled runs always compile from source.
+    if not args.no_cache and not args.profile:
+        digest = bytecode_cache.source_hash(filepath)
+        path = bytecode_cache.cache_path(filepath, args.cache_dir, args.optimize)
+        compiler = bytecode_cache.load(path, digest, args.optimize)
+        if compiler is not None:
+            return compiler
+
+    compiler = Compiler()
+    compiler.compile(Parser(tokenize_file(filepath), track_lines=args.profile).parse())
+    if args.optimize:
+        before, after = optimize(compiler)
+        print(f"Optimizer removed {before - after} of {before} instructions", file=sys.stderr)
+    compiler.assemble()
+    if path is not None:
+        bytecode_cache.store(compiler, path, digest, args.optimize)
+    return compiler
+
+def run_native(ast, output_path):
+    """Builds 'ast' into a native binary (kept at 'output_path' if given) and runs it."""
+    assembly = native_compiler.compile_native(ast)
+    with tempfile.TemporaryDirectory() as directory:
+        binary = output_path or os.path.join(directory, "program")
+        native_compiler.build(assembly, binary)
+        sys.stdout.flush()
+        return subprocess.run([os.path.abspath(binary)]).returncode
+
+def write_profile(profiler, collapsed_path):
+    sys.stdout.flush()
+    profiler.report(sys.stderr)
+    if collapsed_path:
+        with open(collapsed_path, "w") as f:
+            f.write(profiler.collapsed())
+
+def run_batch_mode(args):
+    """Runs every file (or manifest job) on the VM across args.jobs processes; returns the exit status."""
+    if args.manifest:
+        jobs = batch.read_manifest(args.manifest)
+    else:
+        jobs = [(filename, {}) for filename in args.filenames]
+    results = batch.run_batch(jobs, args.jobs, args.chunksize, args.optimize, limits_from(args))
+    failures = 0
+    for result in results:
+        label = result.script + (f" {json.dumps(result.inputs)}" if result.inputs else "")
+        if result.error is None:
+            print(f"--- {label} ({result.seconds * 1000:.2f} ms) ---")
+            sys.stdout.write(result.output)
+        else:
+            failures += 1
+            print(f"--- {label} failed ({result.seconds * 1000:.2f} ms) ---")
+            print(f"Error: {result.error}", file=sys.stderr)
+    sys.stdout.flush()
+    total = sum(result.seconds for result in results)
+    print(f"{len(results)} jobs, {failures} failed, {total:.3f} s of run time", file=sys.stderr)
+    return 1 if failures else 0
+
+def limits_from(args):
+    """Returns the Limits set by the --max-* options, or None when there are none."""
+    if args.max_steps is None and args.max_depth is None and args.max_stack is None and args.max_value_size is None:
+        return None
+    return Limits(args.max_steps, args.max_depth, args.max_stack, args.max_value_size)
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python main.py <filename> [--vm]")
-        return
+    arg_parser = argparse.ArgumentParser(description="Run a NotP program.")
+    arg_parser.add_argument("filenames", nargs="*", metavar="filename",
+                            help="program to run; several files run as a batch on the VM")
+    arg_parser.add_argument("--engine", choices=("interpreter", "stack", "closures", "vm", "native"), default="interpreter",
+                            help="execution engine (default: interpreter)")
+    arg_parser.add_argument("--vm", dest="engine", action="store_const", const="vm",
+                            help="shorthand for --engine vm")
+    arg_parser.add_argument("-O", dest="optimize", action="store_true",
+                            help="optimize VM bytecode before running it")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="do not read or write the compiled .notpc bytecode cache")
+    arg_parser.add_argument("--cache-dir",
+                            help="directory for .notpc files (default: next to the source)")
+    arg_parser.add_argument("--max-depth", type=int,
+                            help="maximum NotP call depth (default: unlimited, "
+                                 f"{stack_interpreter.DEFAULT_MAX_DEPTH} for the stack engine)")
+    arg_parser.add_argument("--max-steps", type=int, metavar="N",
+                            help="stop after N steps: jumps, calls and returns on the vm; "
+                                 "loop iterations and calls in the interpreter")
+    arg_parser.add_argument("--max-stack", type=int, metavar="N",
+                            help="maximum vm operand stack entries")
+    arg_parser.add_argument("--max-value-size", type=int, metavar="BYTES",
+                            help="maximum size of one string, array or integer (interpreter and vm)")
+    arg_parser.add_argument("--native-output", metavar="FILE",
+                            help="with --engine native, keep the built executable at FILE")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="print opcode, function and hot-line timings to stderr (interpreter and vm)")
+    arg_parser.add_argument("--profile-output", metavar="FILE",
+                            help="with --profile, also write collapsed stacks for flamegraph tools to FILE")
+    arg_parser.add_argument("--memoize", action="store_true",
+                            help="cache results of pure functions and print hit/miss counts to stderr "
+                                 "(interpreter and vm)")
+    arg_parser.add_argument("--memo-size", type=int, default=DEFAULT_MAXSIZE,
+                            help=f"entries kept per memoized function (default: {DEFAULT_MAXSIZE})")
+    arg_parser.add_argument("--jit", action="store_true",
+                            help="compile frequently called functions to Python (vm only)")
+    arg_parser.add_argument("--jit-threshold", type=int, default=DEFAULT_THRESHOLD,
+                            help=f"calls before a function is compiled (default: {DEFAULT_THRESHOLD})")
+    arg_parser.add_argument("--jobs", type=int, metavar="N",
+                            help="run the files as a batch on N worker processes (default: one per CPU)")
+    arg_parser.add_argument("--manifest", metavar="FILE",
+                            help="run the JSON Lines (script, inputs) jobs in FILE as a batch")
+    arg_parser.add_argument("--chunksize", type=int,
+                            help="jobs sent to a batch worker at a time (default: spread over 4 chunks per worker)")
+    args = arg_parser.parse_args()
+    if args.manifest or args.jobs or len(args.filenames) > 1:
+        if args.engine not in ("interpreter", "vm") or args.profile or args.memoize or args.jit:
+            arg_parser.error("batch mode runs on the vm and only supports -O and the --max-* limits")
+        if args.manifest and args.filenames:
+            arg_parser.error("give either files or --manifest, not both")
+        sys.exit(run_batch_mode(args))
+    if not args.filenames:
+        arg_parser.error("a filename is required")
+    if args.profile and args.engine in ("closures", "stack", "native"):
+        arg_parser.error("--profile is supported for the interpreter and vm engines")
+    if args.memoize and args.engine in ("closures", "stack", "native"):
+        arg_parser.error("--memoize is supported for the interpreter and vm engines")
+    if args.jit and (args.engine != "vm" or args.profile):
+        arg_parser.error("--jit requires the vm engine and cannot be combined with --profile")
+    limits = limits_from(args)
+    if args.engine == "stack":
+        if args.max_steps is not None or args.max_stack is not None or args.max_value_size is not None:
+            arg_parser.error("the stack engine only supports --max-depth")
+    elif limits is not None:
+        if args.engine in ("closures", "native"):
+            arg_parser.error("the --max-* limits are supported for the interpreter and vm engines")
+        if args.profile or args.jit:
+            arg_parser.error("the --max-* limits cannot be combined with --profile or --jit")
+    profiler = Profiler() if args.profile else None
+    memo = None
+    jit = Jit(args.jit_threshold) if args.jit else None
 
-    filepath = sys.argv[1]
-    
-    use_vm = len(sys.argv) > 2 and sys.argv[2] == "--vm"
+    filepath = args.filenames[0]
 
     try:
-        with open(filepath) as f:
-            code = f.read()
+        if args.engine == "vm":
+            compiler = compile_for_vm(filepath, args)
+        else:
+            tokens = tokenize_file(filepath)
     except FileNotFoundError:
         print(f"Error: File not found at '{filepath}'")
         return
-    
-    tokens = lexer(code)
-    parser = Parser(tokens)
-    ast = parser.parse()
-
-    if use_vm:
-        print("--- Running on VM ---")
-        compiler = Compiler()
-        compiler.compile(ast)
-        #print("AST: ", ast)
-        compiler.run()
-    else:
-        print("--- Running with Interpreter ---")
-        interpret(ast)
+
+    try:
+        if args.engine == "vm":
+            if args.memoize:
+                memo = MemoTable([code.name for code in compiler.functions_by_index if code and code.pure],
+                                 args.memo_size)
+            print("--- Running on VM ---")
+            compiler.run(profiler, memo, jit, limits=limits)
+            return
+
+        parser = Parser(tokens, track_lines=args.profile)
+        ast = parser.parse()
+        if args.memoize:
+            memo = interpreter.memo = MemoTable(find_pure_functions(ast), args.memo_size)
+
+        if args.engine == "closures":
+            print("--- Running with Closure Compiler ---")
+            compile_closures(ast)()
+        elif args.engine == "native":
+            print("--- Running Native ---")
+            try:
+                status = run_native(ast, args.native_output)
+            except native_compiler.Unsupported as reason:
+                print(f"Error: the native backend does not support this program: {reason}", file=sys.stderr)
+                sys.exit(1)
+            if status:
+                sys.exit(status)
+        elif args.engine == "stack":
+            print("--- Running with Stack Interpreter ---")
+            stack_interpreter.run(resolve(ast), max_depth=args.max_depth or stack_interpreter.DEFAULT_MAX_DEPTH)
+        elif profiler is not None:
+            print("--- Running with Interpreter ---")
+            profile(resolve(ast), profiler)
+        elif limits is not None:
+            print("--- Running with Interpreter ---")
+            metered(resolve(ast), limits)
+        else:
+            print("--- Running with Interpreter ---")
+            interpret(resolve(ast))
+    except LimitExceeded as error:
+        sys.stdout.flush()
+        print(f"Error: {error}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if profiler is not None:
+            write_profile(profiler, args.profile_output)
+        if memo is not None:
+            sys.stdout.flush()
+            memo.report(sys.stderr)
+        if jit is not None:
+            sys.stdout.flush()
+            jit.report(sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,176 @@
+"""
+Automatic memoization of pure NotP functions.
+
+find_pure_functions() decides which top-level functions can be cached.
+MemoTable holds one bounded LRU cache per pure function. The VM
+(Compiler.run(memo=...)) and the interpreter (interpreter.memo) consult
+it on calls.
+"""
+
+from collections import OrderedDict
+
+from stdlib import BUILTINS
+
+DEFAULT_MAXSIZE = 1024
+MISSING = object()
+
+
+def _unwrap(stmt):
+    while stmt[0] == "line":
+        stmt = stmt[2]
+    return stmt
+
+
+def _walk(node):
+    """Yields every node of a plain (unresolved) AST, including nested function bodies."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, tuple) or not node or not isinstance(node[0], str):
+            continue
+        yield node
+        for child in node[1:]:
+            if isinstance(child, tuple):
+                stack.append(child)
+            elif isinstance(child, list):
+                stack.extend(item for item in child if isinstance(item, tuple))
+
+
+def _top_level_assignments(statements, names):
+    for stmt in statements:
+        stmt = _unwrap(stmt)
+        if stmt[0] == "assign":
+            names.add(stmt[1])
+        elif stmt[0] == "block":
+            _top_level_assignments(stmt[1], names)
+        elif stmt[0] == "if":
+            _top_level_assignments(stmt[2][1], names)
+            if stmt[3]:
+                _top_level_assignments(stmt[3][1], names)
+        elif stmt[0] == "while":
+            _top_level_assignments(stmt[2][1], names)
+    return names
+
+
+def _analyze(function, global_names):
+    """Returns (may_be_pure, called_names) for one function node."""
+    _, _, params, body = function
+    params = set(params)
+    local_names = {node[1] for node in _walk(body) if node[0] == "assign"}
+    callees = set()
+    for node in _walk(body):
+        kind = node[0]
+        # Array literals are left out too: a cached call would hand every caller the same mutable array.
+        if kind in ("print", "function", "array", "store_index"):
+            return False, callees
+        if kind == "variable":
+            name = node[1]
+            if name in params:
+                continue
+            # A local that is read before it is assigned falls back to the
+            # global of the same name, so it only counts as local if no such global exists.
+            if name not in local_names or name in global_names:
+                return False, callees
+        elif kind == "call":
+            callees.add(node[1])
+    return True, callees
+
+
+def find_pure_functions(program):
+    """
+    Returns the names of top-level functions whose result depends only on
+    their arguments. Such a function does not print, does not read or write
+    globals, does not define functions, does not create or modify arrays, and
+    only calls functions that are themselves pure (builtins do not count).
+    Names defined more than once or also used as variables or parameters
+    are never considered.
+    """
+    statements = [_unwrap(stmt) for stmt in program[1]]
+    definitions = {}
+    # Names that can be rebound to something else: variables and parameters
+    assigned = set()
+    for node in _walk(program):
+        if node[0] == "function":
+            definitions.setdefault(node[1], []).append(node)
+            assigned.update(node[2])
+        elif node[0] == "assign":
+            assigned.add(node[1])
+
+    global_names = _top_level_assignments(statements, set())
+    top_level = {stmt[1] for stmt in statements if stmt[0] == "function"}
+    candidates = {}
+    for name, nodes in definitions.items():
+        # A call to a builtin's name reaches the builtin until the program's definition has run
+        if len(nodes) != 1 or name in assigned or name not in top_level or name in BUILTINS:
+            continue
+        may_be_pure, callees = _analyze(nodes[0], global_names)
+        if may_be_pure:
+            candidates[name] = callees
+
+    # Drop functions that call anything outside the candidate set until nothing changes.
+    changed = True
+    while changed:
+        changed = False
+        for name, callees in list(candidates.items()):
+            if not callees <= candidates.keys():
+                del candidates[name]
+                changed = True
+    return frozenset(candidates)
+
+
+def memo_key(args):
+    """
+    Returns the cache key for a list of argument values. Each value is
+    paired with its type, since True == 1 and False == 0 would otherwise
+    share an entry.
+    """
+    return tuple([(type(arg), arg) for arg in args])
+
+
+class LRUCache:
+    """A bounded mapping that evicts the least recently used entry."""
+    __slots__ = ("maxsize", "data", "hits", "misses")
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached value, or MISSING. Unhashable keys always miss."""
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return MISSING
+        except TypeError:
+            return MISSING
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        try:
+            self.data[key] = value
+        except TypeError:
+            return
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+
+class MemoTable:
+    """One LRUCache per pure function, keyed by function name."""
+
+    def __init__(self, pure_names, maxsize=DEFAULT_MAXSIZE):
+        self.caches = {name: LRUCache(maxsize) for name in pure_names}
+
+    def stats(self):
+        """Returns {name: (hits, misses, entries)}."""
+        return {name: (cache.hits, cache.misses, len(cache.data)) for name, cache in self.caches.items()}
+
+    def report(self, out):
+        for name, (hits, misses, entries) in sorted(self.stats().items()):
+            if hits or misses:
+                print(f"memo {name}: {hits} hits, {misses} misses, {entries} cached", file=out)
@@ -0,0 +1,437 @@
+"""
+Native x86-64 Linux backend for the integer subset of NotP.
+
+NativeCompiler turns a 'program' AST into GNU assembler source (Intel
+syntax). build() hands that source to gcc, which assembles it and links
+it against libc. The subset covers integer variables, arithmetic,
+comparisons, if/while, functions and print. Printed values may be
+integers, comparison results or string literals. Scoping follows the VM:
+names assigned in a function body are locals, and a local read before it
+is assigned falls back to the global of the same name.
+
+Differences from the VM: integers are 64-bit and wrap on overflow, the
+value INT64_MIN is reserved to mark unassigned variables, and recursion
+depth is bounded by the native stack. Runtime errors print the same
+message as the VM's exception to stderr and exit with status 1.
+Programs outside the subset raise Unsupported at compile time.
+"""
+
+import os
+import subprocess
+import tempfile
+
+from compiler import assigned_names
+from stdlib import BUILTINS
+
+UNSET_VALUE = -(1 << 63)
+
+COMPARISONS = {"eq": "e", "ne": "ne", "lt": "l", "gt": "g", "le": "le", "ge": "ge"}
+
+RUNTIME = """
+    .text
+notp_print_int:
+    push rbx
+    mov rbx, rsp
+    and rsp, -16
+    mov rsi, rdi
+    lea rdi, [rip + .Lfmt_int]
+    xor eax, eax
+    call printf@PLT
+    mov rsp, rbx
+    pop rbx
+    ret
+notp_print_bool:
+    lea rax, [rip + .Lstr_true]
+    lea rcx, [rip + .Lstr_false]
+    test rdi, rdi
+    cmovz rax, rcx
+    mov rdi, rax
+notp_print_str:
+    push rbx
+    mov rbx, rsp
+    and rsp, -16
+    call puts@PLT
+    mov rsp, rbx
+    pop rbx
+    ret
+notp_error:
+    and rsp, -16
+    mov rdx, rdi
+    lea rsi, [rip + .Lfmt_error]
+    mov edi, 2
+    xor eax, eax
+    call dprintf@PLT
+    mov edi, 1
+    call exit@PLT
+    .section .rodata
+.Lfmt_int:
+    .asciz "%ld\\n"
+.Lfmt_error:
+    .asciz "%s\\n"
+.Lstr_true:
+    .asciz "True"
+.Lstr_false:
+    .asciz "False"
+"""
+
+
+class Unsupported(Exception):
+    """Raised for programs that use something outside the native subset."""
+
+
+def _unwrap(stmt):
+    while stmt[0] == "line":
+        stmt = stmt[2]
+    return stmt
+
+
+def _always_returns(statements):
+    """True when every path through 'statements' ends in a 'return'."""
+    if not statements:
+        return False
+    last = _unwrap(statements[-1])
+    if last[0] == "return":
+        return True
+    if last[0] == "block":
+        return _always_returns(last[1])
+    if last[0] == "if" and last[3]:
+        return _always_returns(last[2][1]) and _always_returns(last[3][1])
+    return False
+
+
+def _ascii_bytes(text):
+    data = text.encode("utf-8") + b"\0"
+    return ", ".join(str(byte) for byte in data)
+
+
+class NativeCompiler:
+    """Compiles a NotP AST into x86-64 assembly for gcc."""
+
+    def __init__(self):
+        self.lines = []
+        self.strings = {}
+        self.globals = set()
+        self.functions = {}
+        self._labels = 0
+        self._current = None
+
+    # --- Driver ---
+
+    def compile(self, ast):
+        """Returns the assembly source for a 'program' AST, or raises Unsupported."""
+        if ast[0] != "program":
+            raise Unsupported(f"expected a program, got '{ast[0]}'")
+        self._collect_functions(ast[1])
+
+        self.lines = ["    .intel_syntax noprefix", "    .text", "    .globl main", "main:",
+                      "    push rbp", "    mov rbp, rsp"]
+        for stmt in ast[1]:
+            self.statement(stmt)
+        self.lines += ["    xor eax, eax", "    leave", "    ret"]
+
+        # Later definitions replace earlier ones, as in Compiler.functions
+        for name, function in self.functions.items():
+            self.function(name, function)
+
+        data = ["    .data", "    .balign 8"]
+        data += [f"notp_g_{name}:\n    .quad {UNSET_VALUE}" for name in sorted(self.globals)]
+        data.append("    .section .rodata")
+        data += [f"{label}:\n    .byte {_ascii_bytes(text)}" for text, label in self.strings.items()]
+        data.append('    .section .note.GNU-stack,"",@progbits')
+        return "\n".join(self.lines + [RUNTIME] + data) + "\n"
+
+    def _collect_functions(self, statements):
+        for stmt in statements:
+            stmt = _unwrap(stmt)
+            if stmt[0] == "function":
+                _, name, params, body = stmt
+                local_names = list(params)
+                for local in assigned_names(body[1]):
+                    if local not in local_names:
+                        local_names.append(local)
+                self.functions[name] = {"params": params, "locals": local_names, "body": body,
+                                        "returns_value": _always_returns(body[1])}
+                self._collect_functions(body[1])
+            elif stmt[0] == "block":
+                self._collect_functions(stmt[1])
+            elif stmt[0] == "if":
+                self._collect_functions(stmt[2][1])
+                if stmt[3]:
+                    self._collect_functions(stmt[3][1])
+            elif stmt[0] == "while":
+                self._collect_functions(stmt[2][1])
+
+    # --- Helpers ---
+
+    def emit(self, line):
+        self.lines.append(f"    {line}")
+
+    def label(self):
+        self._labels += 1
+        return f".L{self._labels}"
+
+    def string(self, text):
+        if text not in self.strings:
+            self.strings[text] = f".Lstr{len(self.strings)}"
+        return self.strings[text]
+
+    def error(self, message):
+        """Emits a call that prints 'message' to stderr and exits with status 1."""
+        self.emit(f"lea rdi, [rip + {self.string(message)}]")
+        self.emit("call notp_error")
+
+    def _local_offset(self, name):
+        if self._current is None or name not in self._current["slots"]:
+            return None
+        return -8 * (self._current["slots"][name] + 1)
+
+    def load(self, name):
+        """Loads a variable into rax, with the VM's fallback from an unassigned local to the global."""
+        offset = self._local_offset(name)
+        if offset is not None and name in self._current["params"]:
+            # Parameters are always assigned
+            self.emit(f"mov rax, qword ptr [rbp {offset:+d}]")
+            return
+        done = self.label()
+        self.globals.add(name)
+        if offset is not None:
+            self.emit(f"mov rax, qword ptr [rbp {offset:+d}]")
+            self.emit(f"movabs rcx, {UNSET_VALUE}")
+            self.emit("cmp rax, rcx")
+            self.emit(f"jne {done}")
+        else:
+            self.emit(f"movabs rcx, {UNSET_VALUE}")
+        self.emit(f"mov rax, qword ptr [rip + notp_g_{name}]")
+        self.emit("cmp rax, rcx")
+        self.emit(f"jne {done}")
+        self.error(f"NameError: name '{name}' is not defined")
+        self.lines.append(f"{done}:")
+
+    def store(self, name):
+        offset = self._local_offset(name)
+        if offset is not None:
+            self.emit(f"mov qword ptr [rbp {offset:+d}], rax")
+        else:
+            self.globals.add(name)
+            self.emit(f"mov qword ptr [rip + notp_g_{name}], rax")
+
+    # --- Statements ---
+
+    def statement(self, stmt):
+        stmt = _unwrap(stmt)
+        kind = stmt[0]
+
+        if kind == "assign":
+            if self.expression(stmt[2]) != "int":
+                raise Unsupported(f"'{stmt[1]}' is assigned a non-integer value")
+            self.store(stmt[1])
+
+        elif kind == "print":
+            value = stmt[1]
+            if value[0] == "string":
+                self.emit(f"lea rdi, [rip + {self.string(value[1][1:-1])}]")
+                self.emit("call notp_print_str")
+                return
+            kind = self.expression(value)
+            self.emit("mov rdi, rax")
+            self.emit("call notp_print_bool" if kind == "bool" else "call notp_print_int")
+
+        elif kind == "block":
+            for inner in stmt[1]:
+                self.statement(inner)
+
+        elif kind == "if":
+            else_label, end_label = self.label(), self.label()
+            self.expression(stmt[1])
+            self.emit("test rax, rax")
+            self.emit(f"je {else_label}")
+            self.statement(stmt[2])
+            self.emit(f"jmp {end_label}")
+            self.lines.append(f"{else_label}:")
+            if stmt[3]:
+                self.statement(stmt[3])
+            self.lines.append(f"{end_label}:")
+
+        elif kind == "while":
+            start_label, end_label = self.label(), self.label()
+            self.lines.append(f"{start_label}:")
+            self.expression(stmt[1])
+            self.emit("test rax, rax")
+            self.emit(f"je {end_label}")
+            self.statement(stmt[2])
+            self.emit(f"jmp {start_label}")
+            self.lines.append(f"{end_label}:")
+
+        elif kind == "function":
+            # Compiled separately by compile()
+            pass
+
+        elif kind == "return":
+            if self._current is None:
+                raise Unsupported("'return' outside of a function")
+            value = stmt[1]
+            if value[0] == "call" and self._tail_call(value):
+                return
+            if self.expression(value) != "int":
+                raise Unsupported(f"function '{self._current['name']}' returns a non-integer value")
+            self.emit(f"jmp {self._current['epilogue']}")
+
+        elif kind == "expression_statement":
+            value = stmt[1]
+            if value[0] == "call":
+                self.call(value, result_used=False)
+            else:
+                self.expression(value)
+
+        else:
+            raise Unsupported(f"statement '{kind}'")
+
+    def function(self, name, function):
+        params, local_names = function["params"], function["locals"]
+        self._current = {"name": name, "slots": {local: slot for slot, local in enumerate(local_names)},
+                         "params": params, "epilogue": self.label()}
+        frame_size = (8 * len(local_names) + 15) & ~15
+        self.lines.append(f"notp_f_{name}:")
+        self.emit("push rbp")
+        self.emit("mov rbp, rsp")
+        if frame_size:
+            self.emit(f"sub rsp, {frame_size}")
+        # Arguments are pushed left to right, so the last one sits just above the return address.
+        for slot in range(len(params)):
+            self.emit(f"mov rax, qword ptr [rbp + {16 + 8 * (len(params) - 1 - slot)}]")
+            self.emit(f"mov qword ptr [rbp {-8 * (slot + 1):+d}], rax")
+        if len(local_names) > len(params):
+            self.emit(f"movabs rax, {UNSET_VALUE}")
+            for slot in range(len(params), len(local_names)):
+                self.emit(f"mov qword ptr [rbp {-8 * (slot + 1):+d}], rax")
+        for stmt in function["body"][1]:
+            self.statement(stmt)
+        self.lines.append(f"{self._current['epilogue']}:")
+        self.emit("leave")
+        self.emit("ret")
+        self._current = None
+
+    def _check_call(self, name, args):
+        """Returns the callee's record, or emits the VM's error and returns None."""
+        callee = self.functions.get(name)
+        if name in BUILTINS:
+            # Even a program's own function of that name is the builtin until its definition runs
+            raise Unsupported(f"builtin '{name}'")
+        if callee is None:
+            self.error(f"NameError: function '{name}' is not defined")
+        elif len(callee["params"]) != len(args):
+            self.error(f"TypeError: function '{name}' takes {len(callee['params'])} arguments "
+                       f"but {len(args)} were given")
+        else:
+            return callee
+        return None
+
+    def _tail_call(self, value):
+        """'return f(...)' with the caller's argument count: reuse the frame and jump. Returns False otherwise."""
+        name, args = value[1], value[2]
+        callee = self.functions.get(name)
+        if callee is None or len(callee["params"]) != len(args) or len(args) != len(self._current["params"]):
+            return False
+        if not callee["returns_value"]:
+            raise Unsupported(f"the result of '{name}' may be None")
+        for arg in args:
+            self.argument(arg)
+        for position in range(len(args) - 1, -1, -1):
+            self.emit("pop rax")
+            self.emit(f"mov qword ptr [rbp + {16 + 8 * (len(args) - 1 - position)}], rax")
+        self.emit("leave")
+        self.emit(f"jmp notp_f_{name}")
+        return True
+
+    def argument(self, arg):
+        if self.expression(arg) != "int":
+            raise Unsupported("non-integer argument")
+        self.emit("push rax")
+
+    def call(self, value, result_used=True):
+        name, args = value[1], value[2]
+        for arg in args:
+            self.argument(arg)
+        callee = self._check_call(name, args)
+        if callee is None:
+            return "int"
+        if result_used and not callee["returns_value"]:
+            raise Unsupported(f"the result of '{name}' may be None")
+        self.emit(f"call notp_f_{name}")
+        if args:
+            self.emit(f"add rsp, {8 * len(args)}")
+        return "int"
+
+    # --- Expressions ---
+
+    def expression(self, node):
+        """Leaves the value of 'node' in rax and returns its type, "int" or "bool"."""
+        kind = node[0]
+
+        if kind == "number":
+            if not UNSET_VALUE < node[1] < -UNSET_VALUE:
+                raise Unsupported(f"integer literal {node[1]} does not fit in 64 bits")
+            self.emit(f"movabs rax, {node[1]}")
+            return "int"
+
+        if kind == "variable":
+            self.load(node[1])
+            return "int"
+
+        if kind == "call":
+            return self.call(node)
+
+        if kind in ("add", "sub", "mult", "div") or kind in COMPARISONS:
+            self.expression(node[1])
+            self.emit("push rax")
+            self.expression(node[2])
+            self.emit("mov rcx, rax")
+            self.emit("pop rax")
+            if kind == "add":
+                self.emit("add rax, rcx")
+            elif kind == "sub":
+                self.emit("sub rax, rcx")
+            elif kind == "mult":
+                self.emit("imul rax, rcx")
+            elif kind == "div":
+                self.divide()
+            else:
+                self.emit("cmp rax, rcx")
+                self.emit(f"set{COMPARISONS[kind]} al")
+                self.emit("movzx eax, al")
+                return "bool"
+            return "int"
+
+        if kind == "string":
+            raise Unsupported("strings outside of print")
+        raise Unsupported(f"expression '{kind}'")
+
+    def divide(self):
+        """rax // rcx with Python's floor semantics."""
+        nonzero, done = self.label(), self.label()
+        self.emit("test rcx, rcx")
+        self.emit(f"jne {nonzero}")
+        self.error("ZeroDivisionError: integer division or modulo by zero")
+        self.lines.append(f"{nonzero}:")
+        self.emit("cqo")
+        self.emit("idiv rcx")
+        # idiv truncates toward zero; step down when the remainder and divisor differ in sign
+        self.emit("test rdx, rdx")
+        self.emit(f"je {done}")
+        self.emit("xor rdx, rcx")
+        self.emit(f"jns {done}")
+        self.emit("dec rax")
+        self.lines.append(f"{done}:")
+
+
+def compile_native(ast):
+    return NativeCompiler().compile(ast)
+
+
+def build(assembly, output_path, cc="gcc"):
+    """Assembles and links 'assembly' into an executable at 'output_path'."""
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = os.path.join(directory, "program.s")
+        with open(source_path, "w") as f:
+            f.write(assembly)
+        subprocess.run([cc, "-o", output_path, source_path], check=True)
@@ -0,0 +1,155 @@
+"""
+Integer opcodes for the NotP virtual machine.
+
+Compiler.compile() emits symbolic instructions such as ("LOAD_CONST", 5).
+Compiler.assemble() encodes them as a flat list of ints, two words per
+instruction: the opcode followed by a single operand (0 when unused).
+
+Compiler.run() quickens code while it executes: it rewrites a generic
+instruction in place to a specialized form for the operand types it
+sees, keeping the operand. SPECIALIZED_FROM maps every specialized
+opcode back to its generic one.
+"""
+
+OPNAMES = [
+    "LOAD_CONST",
+    "LOAD_FAST",
+    "STORE_FAST",
+    "LOAD_GLOBAL",
+    "STORE_GLOBAL",
+    "POP_TOP",
+    "PRINT",
+    "BINARY_ADD",
+    "BINARY_SUB",
+    "BINARY_MUL",
+    "BINARY_DIV",
+    "BINARY_EQ",
+    "BINARY_NE",
+    "BINARY_LT",
+    "BINARY_GT",
+    "BINARY_LE",
+    "BINARY_GE",
+    "JUMP",
+    "JUMP_IF_FALSE",
+    "CALL",
+    "RETURN",
+    "TAIL_CALL",
+    "HALT",
+    "BUILD_ARRAY",
+    "LOAD_INDEX",
+    "STORE_INDEX",
+    "CALL_BUILTIN",
+    "FOR_RANGE_FAST",
+    "FOR_RANGE_GLOBAL",
+    # Superinstructions, only emitted by optimizer.py
+    "INCREMENT_FAST",
+    "INCREMENT_GLOBAL",
+    "JUMP_IF_NOT_EQ",
+    "JUMP_IF_NOT_NE",
+    "JUMP_IF_NOT_LT",
+    "JUMP_IF_NOT_GT",
+    "JUMP_IF_NOT_LE",
+    "JUMP_IF_NOT_GE",
+    # Specialized forms, only written by Compiler.run() while it executes
+    "BINARY_ADD_INT",
+    "BINARY_ADD_STR",
+    "BINARY_SUB_INT",
+    "BINARY_MUL_INT",
+    "JUMP_IF_NOT_EQ_INT",
+    "JUMP_IF_NOT_NE_INT",
+    "JUMP_IF_NOT_LT_INT",
+    "JUMP_IF_NOT_GT_INT",
+    "JUMP_IF_NOT_LE_INT",
+    "JUMP_IF_NOT_GE_INT",
+    "CALL_EXACT_ARGS",
+]
+
+OPMAP = {name: opcode for opcode, name in enumerate(OPNAMES)}
+
+LOAD_CONST = OPMAP["LOAD_CONST"]
+LOAD_FAST = OPMAP["LOAD_FAST"]
+STORE_FAST = OPMAP["STORE_FAST"]
+LOAD_GLOBAL = OPMAP["LOAD_GLOBAL"]
+STORE_GLOBAL = OPMAP["STORE_GLOBAL"]
+POP_TOP = OPMAP["POP_TOP"]
+PRINT = OPMAP["PRINT"]
+BINARY_ADD = OPMAP["BINARY_ADD"]
+BINARY_SUB = OPMAP["BINARY_SUB"]
+BINARY_MUL = OPMAP["BINARY_MUL"]
+BINARY_DIV = OPMAP["BINARY_DIV"]
+BINARY_EQ = OPMAP["BINARY_EQ"]
+BINARY_NE = OPMAP["BINARY_NE"]
+BINARY_LT = OPMAP["BINARY_LT"]
+BINARY_GT = OPMAP["BINARY_GT"]
+BINARY_LE = OPMAP["BINARY_LE"]
+BINARY_GE = OPMAP["BINARY_GE"]
+JUMP = OPMAP["JUMP"]
+JUMP_IF_FALSE = OPMAP["JUMP_IF_FALSE"]
+CALL = OPMAP["CALL"]
+RETURN = OPMAP["RETURN"]
+TAIL_CALL = OPMAP["TAIL_CALL"]
+HALT = OPMAP["HALT"]
+BUILD_ARRAY = OPMAP["BUILD_ARRAY"]
+LOAD_INDEX = OPMAP["LOAD_INDEX"]
+STORE_INDEX = OPMAP["STORE_INDEX"]
+CALL_BUILTIN = OPMAP["CALL_BUILTIN"]
+FOR_RANGE_FAST = OPMAP["FOR_RANGE_FAST"]
+FOR_RANGE_GLOBAL = OPMAP["FOR_RANGE_GLOBAL"]
+INCREMENT_FAST = OPMAP["INCREMENT_FAST"]
+INCREMENT_GLOBAL = OPMAP["INCREMENT_GLOBAL"]
+JUMP_IF_NOT_EQ = OPMAP["JUMP_IF_NOT_EQ"]
+JUMP_IF_NOT_NE = OPMAP["JUMP_IF_NOT_NE"]
+JUMP_IF_NOT_LT = OPMAP["JUMP_IF_NOT_LT"]
+JUMP_IF_NOT_GT = OPMAP["JUMP_IF_NOT_GT"]
+JUMP_IF_NOT_LE = OPMAP["JUMP_IF_NOT_LE"]
+JUMP_IF_NOT_GE = OPMAP["JUMP_IF_NOT_GE"]
+BINARY_ADD_INT = OPMAP["BINARY_ADD_INT"]
+BINARY_ADD_STR = OPMAP["BINARY_ADD_STR"]
+BINARY_SUB_INT = OPMAP["BINARY_SUB_INT"]
+BINARY_MUL_INT = OPMAP["BINARY_MUL_INT"]
+JUMP_IF_NOT_EQ_INT = OPMAP["JUMP_IF_NOT_EQ_INT"]
+JUMP_IF_NOT_NE_INT = OPMAP["JUMP_IF_NOT_NE_INT"]
+JUMP_IF_NOT_LT_INT = OPMAP["JUMP_IF_NOT_LT_INT"]
+JUMP_IF_NOT_GT_INT = OPMAP["JUMP_IF_NOT_GT_INT"]
+JUMP_IF_NOT_LE_INT = OPMAP["JUMP_IF_NOT_LE_INT"]
+JUMP_IF_NOT_GE_INT = OPMAP["JUMP_IF_NOT_GE_INT"]
+CALL_EXACT_ARGS = OPMAP["CALL_EXACT_ARGS"]
+
+# Specialized opcode -> generic opcode. Names ending in _INT/_STR drop the suffix; CALL_EXACT_ARGS is a CALL.
+SPECIALIZED_FROM = {OPMAP[name]: OPMAP[name.rsplit("_", 1)[0]] for name in OPNAMES if name.endswith(("_INT", "_STR"))}
+SPECIALIZED_FROM[CALL_EXACT_ARGS] = CALL
+
+# Operand kinds, used by the assembler to encode symbolic arguments.
+HAS_CONST = {LOAD_CONST}
+HAS_NAME = {LOAD_GLOBAL, STORE_GLOBAL}
+HAS_LOCAL = {LOAD_FAST, STORE_FAST}
+HAS_JUMP = {JUMP, JUMP_IF_FALSE, JUMP_IF_NOT_EQ, JUMP_IF_NOT_NE, JUMP_IF_NOT_LT,
+            JUMP_IF_NOT_GT, JUMP_IF_NOT_LE, JUMP_IF_NOT_GE}
+HAS_JUMP |= {op for op, generic in SPECIALIZED_FROM.items() if generic in HAS_JUMP}
+HAS_CALL = {CALL, TAIL_CALL, CALL_EXACT_ARGS, CALL_BUILTIN}
+HAS_INCREMENT = {INCREMENT_FAST, INCREMENT_GLOBAL}
+HAS_COUNT = {BUILD_ARRAY}
+HAS_LOOP = {FOR_RANGE_FAST, FOR_RANGE_GLOBAL}
+
+# The call opcodes pack the function's name index and the argument count into one operand.
+CALL_ARGC_BITS = 8
+CALL_ARGC_MASK = (1 << CALL_ARGC_BITS) - 1
+
+# INCREMENT_* pack a local slot or name index with a small signed step.
+INCREMENT_BITS = 16
+INCREMENT_MIN = -(1 << (INCREMENT_BITS - 1))
+INCREMENT_MAX = (1 << (INCREMENT_BITS - 1)) - 1
+INCREMENT_MASK = (1 << INCREMENT_BITS) - 1
+
+# FOR_RANGE_* keep their jump target (as a word offset) in the low bits and
+# the constant-pool index of their (counter, limit, step, inclusive) tuple above it.
+LOOP_TARGET_BITS = 32
+LOOP_TARGET_MASK = (1 << LOOP_TARGET_BITS) - 1
+
+
+def generic_code(code):
+    """Returns a copy of assembled code with every specialized instruction turned back into its generic form."""
+    code = list(code)
+    for ip in range(0, len(code), 2):
+        code[ip] = SPECIALIZED_FROM.get(code[ip], code[ip])
+    return code
@@ -0,0 +1,201 @@
+"""
+Multi-pass optimizer for the symbolic bytecode produced by Compiler.compile().
+
+It runs after compile() and before assemble()/run(). Jump operands are
+instruction indices. Every pass rewrites a list in place, using None for
+dropped instructions, and _compact() then closes the gaps and retargets jumps.
+The FOR_RANGE_* instructions count as jumps: their target comes first, and
+the counter, limit, step and comparison follow it unchanged.
+"""
+
+import opcodes
+from compiler import BINARY_OPERATORS
+
+JUMP_OPS = {name for name in opcodes.OPNAMES if opcodes.OPMAP[name] in opcodes.HAS_JUMP | opcodes.HAS_LOOP}
+TERMINATORS = ("JUMP", "RETURN", "TAIL_CALL")
+
+COMPARE_JUMPS = {
+    "BINARY_EQ": "JUMP_IF_NOT_EQ", "BINARY_NE": "JUMP_IF_NOT_NE",
+    "BINARY_LT": "JUMP_IF_NOT_LT", "BINARY_GT": "JUMP_IF_NOT_GT",
+    "BINARY_LE": "JUMP_IF_NOT_LE", "BINARY_GE": "JUMP_IF_NOT_GE",
+}
+
+INCREMENTS = {
+    ("LOAD_FAST", "STORE_FAST"): "INCREMENT_FAST",
+    ("LOAD_GLOBAL", "STORE_GLOBAL"): "INCREMENT_GLOBAL",
+}
+
+
+def _targets(code):
+    return {ins[1] for ins in code if ins is not None and ins[0] in JUMP_OPS}
+
+
+def _compact(code, lines=None):
+    """
+    Drops None entries; jumps to a dropped instruction land on the next surviving one.
+    A (index, line) table passed as 'lines' is remapped in place the same way.
+    """
+    new_index = []
+    count = 0
+    for ins in code:
+        new_index.append(count)
+        if ins is not None:
+            count += 1
+    new_index.append(count)
+
+    compacted = []
+    for ins in code:
+        if ins is None:
+            continue
+        if ins[0] in JUMP_OPS:
+            ins = (ins[0], new_index[ins[1]], *ins[2:])
+        compacted.append(ins)
+    if lines:
+        lines[:] = [(new_index[index], line) for index, line in lines]
+    return compacted
+
+
+def fold_constants(code):
+    """LOAD_CONST a; LOAD_CONST b; BINARY_op  ->  LOAD_CONST (a op b)."""
+    changed = False
+    targets = _targets(code)
+    for i in range(len(code) - 2):
+        first, second, op = code[i], code[i + 1], code[i + 2]
+        if (first is None or second is None or op is None or first[0] != "LOAD_CONST"
+                or second[0] != "LOAD_CONST" or op[0] not in BINARY_OPERATORS
+                or i + 1 in targets or i + 2 in targets):
+            continue
+        a, b = first[1], second[1]
+        if op[0] == "BINARY_DIV" and b == 0:
+            continue # Leave the ZeroDivisionError to runtime
+        if op[0] == "BINARY_MUL" and (isinstance(a, str) or isinstance(b, str)):
+            continue # Repeated strings could bloat the constant pool
+        try:
+            result = BINARY_OPERATORS[op[0]](a, b)
+        except TypeError:
+            continue
+        code[i], code[i + 1], code[i + 2] = ("LOAD_CONST", result), None, None
+        changed = True
+    return changed
+
+
+def remove_dead_branches(code):
+    """LOAD_CONST c; JUMP_IF_FALSE t  ->  JUMP t when c is falsy, nothing when it is truthy."""
+    changed = False
+    targets = _targets(code)
+    for i in range(len(code) - 1):
+        load, branch = code[i], code[i + 1]
+        if (load is None or branch is None or load[0] != "LOAD_CONST"
+                or branch[0] != "JUMP_IF_FALSE" or i + 1 in targets):
+            continue
+        code[i] = None if load[1] else ("JUMP", branch[1])
+        code[i + 1] = None
+        changed = True
+    return changed
+
+
+def remove_unreachable(code):
+    """Drops instructions after an unconditional JUMP, RETURN or TAIL_CALL that no jump lands on."""
+    changed = False
+    targets = _targets(code)
+    reachable = True
+    for i, ins in enumerate(code):
+        if i in targets:
+            reachable = True
+        if ins is None:
+            continue
+        if not reachable:
+            code[i] = None
+            changed = True
+        elif ins[0] in TERMINATORS:
+            reachable = False
+    return changed
+
+
+def thread_jumps(code):
+    """Retargets jumps that land on an unconditional JUMP, and drops jumps to the next instruction."""
+    changed = False
+    for i, ins in enumerate(code):
+        if ins is None or ins[0] not in JUMP_OPS:
+            continue
+        target, seen = ins[1], {i}
+        while target < len(code) and target not in seen:
+            seen.add(target)
+            landing = code[target]
+            if landing is None:
+                target += 1
+            elif landing[0] == "JUMP":
+                target = landing[1]
+            else:
+                break
+        if target != ins[1]:
+            code[i] = ins = (ins[0], target, *ins[2:])
+            changed = True
+        if ins[0] == "JUMP" and all(code[j] is None for j in range(i + 1, min(target, len(code)))) and target > i:
+            code[i] = None
+            changed = True
+    return changed
+
+
+def fuse_superinstructions(code):
+    """
+    Replaces common sequences with single instructions:
+      LOAD_x v; LOAD_CONST k; BINARY_ADD/SUB; STORE_x v  ->  INCREMENT_x v, +-k
+      BINARY_<cmp>; JUMP_IF_FALSE t                      ->  JUMP_IF_NOT_<cmp> t
+    """
+    changed = False
+    targets = _targets(code)
+    for i in range(len(code)):
+        ins = code[i]
+        if ins is None:
+            continue
+        if ins[0] in COMPARE_JUMPS and i + 1 < len(code):
+            branch = code[i + 1]
+            if branch is not None and branch[0] == "JUMP_IF_FALSE" and i + 1 not in targets:
+                code[i], code[i + 1] = (COMPARE_JUMPS[ins[0]], branch[1]), None
+                changed = True
+        elif i + 3 < len(code) and not targets.intersection((i + 1, i + 2, i + 3)):
+            load, const, op, store = code[i:i + 4]
+            if (const is None or op is None or store is None
+                    or (load[0], store[0]) not in INCREMENTS or load[1] != store[1]
+                    or const[0] != "LOAD_CONST" or op[0] not in ("BINARY_ADD", "BINARY_SUB")
+                    or type(const[1]) is not int):
+                continue
+            step = const[1] if op[0] == "BINARY_ADD" else -const[1]
+            if not opcodes.INCREMENT_MIN <= step <= opcodes.INCREMENT_MAX:
+                continue
+            code[i:i + 4] = [(INCREMENTS[load[0], store[0]], load[1], step), None, None, None]
+            changed = True
+    return changed
+
+
+PASSES = (fold_constants, remove_dead_branches, thread_jumps, remove_unreachable)
+
+
+def optimize_code(code, lines=None):
+    """Runs the cleanup passes to a fixed point, then fuses superinstructions."""
+    code = list(code)
+    changed = True
+    while changed:
+        changed = False
+        for optimization_pass in PASSES:
+            if optimization_pass(code):
+                changed = True
+                code = _compact(code, lines)
+    if fuse_superinstructions(code):
+        code = _compact(code, lines)
+    return code
+
+
+def optimize(compiler):
+    """
+    Optimizes the main bytecode and every function of a Compiler in place.
+    Returns (instructions_before, instructions_after).
+    """
+    units = [(compiler.bytecode, compiler.bytecode_lines)]
+    units += [(func["bytecode"], func["lines"]) for func in compiler.functions.values()]
+    before = sum(len(unit) for unit, _ in units)
+    for unit, lines in units:
+        unit[:] = optimize_code(unit, lines)
+    compiler.main_code = None # Force re-assembly
+    return before, sum(len(unit) for unit, _ in units)
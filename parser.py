@@ -1,44 +1,48 @@
-from lexer import lexer
+from lexer import TokenStream
+
+
+COMPARISONS = {"EQ": "eq", "NE": "ne", "LT": "lt", "GT": "gt", "LE": "le", "GE": "ge"}
+TERMS = {"PLUS": "add", "MINUS": "sub"}
+FACTORS = {"MULT": "mult", "DIV": "div"}
 
 
 class Parser:
     """
     Parses a list of tokens into an Abstract Syntax Tree (AST).
+
+    Nodes are immutable tuples, so leaves are shared: every occurrence of
+    the same variable, number or string literal is the same tuple object.
     """
-    def __init__(self, tokens):
-        """Initializes the parser with a list of tokens."""
-        self.tokens = tokens
-        self.position = 0
+    def __init__(self, tokens, track_lines=False):
+        """
+        Initializes the parser with a list or iterator of tokens.
+        With track_lines, every statement is wrapped in a ("line", number, stmt) node.
+        """
+        self.tokens = TokenStream(tokens)
+        self.track_lines = track_lines
+        # (kind, value) -> the one shared leaf node
+        self._leaves = {}
 
     def peek(self):
         """
         Non-destructively looks at the next significant token.
-        It skips over non-essential tokens like newlines and comments.
-        This method does NOT advance the parser's position.
+        Newlines and comments never reach the parser; the token stream
+        drops them once as it reads ahead.
         """
-        temp_pos = self.position
-        while temp_pos < len(self.tokens):
-            token = self.tokens[temp_pos]
-            if token[0] not in ("NEWLINE", "COMMENT"):
-                return token
-            temp_pos += 1
-        return None
+        return self.tokens.peek()
 
     def consume(self, expected_type=None):
         """
         Consumes the next significant token, advancing the parser's position.
         """
-        while self.position < len(self.tokens):
-            token = self.tokens[self.position]
-            self.position += 1
-            if token[0] not in ("NEWLINE", "COMMENT"):
-                if expected_type and token[0] != expected_type:
-                    raise RuntimeError(f"Expected token {expected_type} but found {token[0]}")
-                return token
-        
-        if expected_type:
-            raise RuntimeError(f"Expected token {expected_type} but found end of input")
-        return None
+        token = self.tokens.next()
+        if token is None:
+            if expected_type:
+                raise RuntimeError(f"Expected token {expected_type} but found end of input")
+            return None
+        if expected_type and token[0] != expected_type:
+            raise RuntimeError(f"Expected token {expected_type} but found {token[0]}")
+        return token
 
     def parse(self):
         """Parses the entire list of tokens into a program AST node."""
@@ -52,7 +56,12 @@ class Parser:
         token = self.peek()
         if not token:
             return None
+        if self.track_lines:
+            return ("line", token[2], self._parse_statement(token))
+        return self._parse_statement(token)
 
+    def _parse_statement(self, token):
+        """Dispatches on the first token of a statement."""
         if token[0] == "PRINT":
             return self.parse_print_statement()
         elif token[0] == "IF":
@@ -66,8 +75,10 @@ class Parser:
         elif token[0] == "ID":
             if self._peek_next_significant()[0] == "ASSIGN":
                 return self.parse_assignment_statement()
-            else:
-                return ("expression_statement", self.parse_expression())
+            expr = self.parse_expression()
+            if expr[0] == "index" and self.peek() and self.peek()[0] == "ASSIGN":
+                return self.parse_index_assignment(expr)
+            return ("expression_statement", expr)
         else:
             raise RuntimeError(f"Unexpected statement starting with token: {token}")
 
@@ -86,6 +97,12 @@ class Parser:
         expr = self.parse_expression()
         return ("assign", var_name, expr)
 
+    def parse_index_assignment(self, target):
+        """Parses the rest of an element assignment: ID[...] = ..."""
+        self.consume("ASSIGN")
+        expr = self.parse_expression()
+        return ("store_index", target[1], target[2], expr)
+
     def parse_if_statement(self):
         """Parses an if-else statement."""
         self.consume("IF")
@@ -145,52 +162,84 @@ class Parser:
     def parse_expression(self):
         """Parses a logical comparison expression (lowest precedence)."""
         left = self.parse_term()
-        while self.peek() and self.peek()[0] in ("EQ", "NE", "LT", "GT", "LE", "GE"):
-            op = self.consume()
-            right = self.parse_term()
-            left = (op[0].lower(), left, right)
+        token = self.peek()
+        while token and token[0] in COMPARISONS:
+            self.consume()
+            left = (COMPARISONS[token[0]], left, self.parse_term())
+            token = self.peek()
         return left
 
     def parse_term(self):
         """Parses an addition/subtraction expression."""
         left = self.parse_factor()
-        while self.peek() and self.peek()[0] in ("PLUS", "MINUS"):
-            op = self.consume()
-            op_name = {"PLUS": "add", "MINUS": "sub"}[op[0]]
-            right = self.parse_factor()
-            left = (op_name, left, right)
+        token = self.peek()
+        while token and token[0] in TERMS:
+            self.consume()
+            left = (TERMS[token[0]], left, self.parse_factor())
+            token = self.peek()
         return left
 
     def parse_factor(self):
         """Parses a multiplication/division expression."""
         left = self.parse_primary()
-        while self.peek() and self.peek()[0] in ("MULT", "DIV"):
-            op = self.consume()
-            op_name = {"MULT": "mult", "DIV": "div"}[op[0]]
-            right = self.parse_primary()
-            left = (op_name, left, right)
+        token = self.peek()
+        while token and token[0] in FACTORS:
+            self.consume()
+            left = (FACTORS[token[0]], left, self.parse_primary())
+            token = self.peek()
         return left
 
     def parse_primary(self):
-        """Parses primary expressions."""
+        """Parses a primary expression followed by any number of [index] suffixes."""
+        expr = self.parse_atom()
+        token = self.peek()
+        while token and token[0] == "LBRACKET":
+            self.consume("LBRACKET")
+            index = self.parse_expression()
+            self.consume("RBRACKET")
+            expr = ("index", expr, index)
+            token = self.peek()
+        return expr
+
+    def _leaf(self, kind, value):
+        """Returns the shared node for a variable or literal."""
+        node = (kind, value)
+        return self._leaves.setdefault(node, node)
+
+    def parse_atom(self):
+        """Parses literals, variables, calls, array literals and parenthesized expressions."""
         token = self.peek()
         if token[0] == "NUMBER":
-            return ("number", int(self.consume()[1]))
+            return self._leaf("number", int(self.consume()[1]))
         elif token[0] == "STRING":
-            return ("string", self.consume()[1])
+            return self._leaf("string", self.consume()[1])
         elif token[0] == "ID":
             if self._peek_next_significant()[0] == "LPAREN":
                 return self.parse_function_call()
             else:
-                return ("variable", self.consume()[1])
+                return self._leaf("variable", self.consume()[1])
         elif token[0] == "LPAREN":
             self.consume("LPAREN")
             expr = self.parse_expression()
             self.consume("RPAREN")
             return expr
+        elif token[0] == "LBRACKET":
+            return self.parse_array_literal()
         else:
             raise RuntimeError(f"Unexpected token in expression: {token}")
 
+    def parse_array_literal(self):
+        """Parses an array literal: [...]"""
+        self.consume("LBRACKET")
+        elements = []
+        if self.peek() and self.peek()[0] != "RBRACKET":
+            elements.append(self.parse_expression())
+            while self.peek() and self.peek()[0] == "COMMA":
+                self.consume("COMMA")
+                elements.append(self.parse_expression())
+        self.consume("RBRACKET")
+        return ("array", elements)
+
     def parse_function_call(self):
         """Parses a function call: name(...)"""
         name = self.consume("ID")[1]
@@ -206,15 +255,4 @@ class Parser:
 
     def _peek_next_significant(self):
         """Helper to look ahead one significant token without consuming."""
-        start_pos = self.position
-        while start_pos < len(self.tokens):
-            if self.tokens[start_pos][0] not in ("NEWLINE", "COMMENT"):
-                break
-            start_pos += 1
-        next_pos = start_pos + 1
-        while next_pos < len(self.tokens):
-            token = self.tokens[next_pos]
-            if token[0] not in ("NEWLINE", "COMMENT"):
-                return token
-            next_pos += 1
-        return ("EOF", None)
\ No newline at end of file
+        return self.tokens.peek(1) or ("EOF", None)
\ No newline at end of file
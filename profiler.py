@@ -0,0 +1,125 @@
+"""
+Execution profiler shared by the VM and the tree-walking interpreter.
+
+Nothing in this module runs unless a Profiler is handed to an engine:
+Compiler.run(profiler=...) switches to a separate instrumented dispatch
+loop, and interpreter.profile() installs the hooks for one run.
+"""
+
+import sys
+import time
+
+from opcodes import OPNAMES
+
+MAIN = "<main>"
+
+
+class FunctionStats:
+    """Call count plus inclusive and exclusive time for one function."""
+    __slots__ = ("calls", "inclusive", "exclusive")
+
+    def __init__(self):
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+
+
+class Profiler:
+    """Collects per-opcode, per-function, per-line and per-stack timings."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.op_counts = [0] * len(OPNAMES)
+        self.op_times = [0.0] * len(OPNAMES)
+        self.functions = {}
+        self.line_counts = {}
+        self.line_times = {}
+        self.stacks = {}
+        # Each open call is [name, start time, time spent in callees]
+        self._frames = []
+        self._active = {}
+        self._current_line = None
+        self._line_start = None
+
+    # --- Events ---
+
+    def instruction(self, op, line, elapsed):
+        """Records one VM instruction and the source line it belongs to."""
+        self.op_counts[op] += 1
+        self.op_times[op] += elapsed
+        if line is not None:
+            self.line_counts[line] = self.line_counts.get(line, 0) + 1
+            self.line_times[line] = self.line_times.get(line, 0.0) + elapsed
+
+    def line(self, line):
+        """Interpreter line event: time since the previous event is charged to the previous line."""
+        now = self.clock()
+        self._flush_line(now)
+        self._current_line = line
+        self._line_start = now
+        self.line_counts[line] = self.line_counts.get(line, 0) + 1
+
+    def enter(self, name):
+        self._active[name] = self._active.get(name, 0) + 1
+        self._frames.append([name, self.clock(), 0.0])
+
+    def exit(self):
+        now = self.clock()
+        name, start, child_time = self._frames.pop()
+        if not self._frames:
+            self._flush_line(now)
+        inclusive = now - start
+        exclusive = inclusive - child_time
+        stats = self.functions.get(name)
+        if stats is None:
+            stats = self.functions[name] = FunctionStats()
+        stats.calls += 1
+        stats.exclusive += exclusive
+        # Recursive calls would count the same time twice; only the outermost frame adds inclusive time.
+        self._active[name] -= 1
+        if not self._active[name]:
+            stats.inclusive += inclusive
+        stack = tuple(frame[0] for frame in self._frames) + (name,)
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + exclusive
+        if self._frames:
+            self._frames[-1][2] += inclusive
+
+    def unwind(self):
+        """Closes frames left open when execution stopped with an error."""
+        while self._frames:
+            self.exit()
+
+    def _flush_line(self, now):
+        if self._current_line is not None:
+            self.line_times[self._current_line] = self.line_times.get(self._current_line, 0.0) + now - self._line_start
+            self._current_line = None
+
+    # --- Output ---
+
+    def report(self, out=sys.stderr, limit=15):
+        """Writes summary tables of opcodes, functions and hot lines."""
+        print("--- Profile ---", file=out)
+        ops = [(OPNAMES[op], count, self.op_times[op]) for op, count in enumerate(self.op_counts) if count]
+        if ops:
+            print(f"{'opcode':<20} {'count':>12} {'total ms':>10} {'ns/op':>8}", file=out)
+            for name, count, total in sorted(ops, key=lambda row: row[2], reverse=True):
+                print(f"{name:<20} {count:>12} {total * 1000:>10.2f} {total / count * 1e9:>8.0f}", file=out)
+            print(file=out)
+
+        print(f"{'function':<20} {'calls':>10} {'incl ms':>10} {'excl ms':>10}", file=out)
+        for name, stats in sorted(self.functions.items(), key=lambda item: item[1].exclusive, reverse=True):
+            print(f"{name:<20} {stats.calls:>10} {stats.inclusive * 1000:>10.2f} {stats.exclusive * 1000:>10.2f}",
+                  file=out)
+
+        if self.line_counts:
+            print(file=out)
+            print(f"{'line':<8} {'hits':>12} {'total ms':>10}", file=out)
+            hot = sorted(self.line_counts, key=lambda line: self.line_times.get(line, 0.0), reverse=True)
+            for line in hot[:limit]:
+                print(f"{line:<8} {self.line_counts[line]:>12} {self.line_times.get(line, 0.0) * 1000:>10.2f}",
+                      file=out)
+
+    def collapsed(self):
+        """Returns stacks in the collapsed format read by flamegraph.pl and speedscope (values in microseconds)."""
+        return "".join(f"{';'.join(stack)} {round(seconds * 1e6)}\n"
+                       for stack, seconds in sorted(self.stacks.items()))
@@ -0,0 +1,134 @@
+from stdlib import BUILTINS
+
+
+class Scope:
+    """The variables declared directly in one program or function body, in slot order."""
+    def __init__(self, names, parent=None):
+        self.names = []
+        self.index = {}
+        self.parent = parent
+        # Name -> the resolved load node, shared by every read of the name in this scope
+        self.loads = {}
+        for name in names:
+            self.declare(name)
+
+    def declare(self, name):
+        """Gives a name a slot in this scope if it does not have one yet."""
+        if name not in self.index:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+        return self.index[name]
+
+    def addresses(self, name):
+        """
+        Returns every (depth, slot) pair that can hold 'name', innermost first.
+        A slot that has not been written yet at runtime falls through to the
+        next address, matching the dynamic lookup of Environment.
+        """
+        found = []
+        scope, depth = self, 0
+        while scope is not None:
+            if name in scope.index:
+                found.append((depth, scope.index[name]))
+            scope, depth = scope.parent, depth + 1
+        return tuple(found)
+
+
+def _declarations(statements, names):
+    """Collects the names a statement list binds in its own scope, skipping nested function bodies."""
+    for stmt in statements:
+        while stmt[0] == "line":
+            stmt = stmt[2]
+        cmd = stmt[0]
+        if cmd == "assign":
+            names.append(stmt[1])
+        elif cmd == "function":
+            names.append(stmt[1])
+        elif cmd == "block":
+            _declarations(stmt[1], names)
+        elif cmd == "if":
+            _declarations(stmt[2][1], names)
+            if stmt[3]:
+                _declarations(stmt[3][1], names)
+        elif cmd == "while":
+            _declarations(stmt[2][1], names)
+    return names
+
+
+def resolve(ast):
+    """
+    Rewrites a 'program' AST so that every variable access carries a fixed
+    slot address. The result is executed by interpret() with a SlotEnvironment.
+    """
+    scope = Scope(_declarations(ast[1], []))
+    statements = [_resolve(stmt, scope) for stmt in ast[1]]
+    return ("resolved_program", tuple(scope.names), statements)
+
+
+def _resolve(ast, scope):
+    cmd = ast[0]
+
+    if cmd == "block":
+        return ("block", [_resolve(stmt, scope) for stmt in ast[1]])
+
+    elif cmd == "line":
+        return ("line", ast[1], _resolve(ast[2], scope))
+
+    elif cmd == "assign":
+        return ("store_slot", ast[1], scope.index[ast[1]], _resolve(ast[2], scope))
+
+    elif cmd in ("print", "return", "expression_statement"):
+        return (cmd, _resolve(ast[1], scope))
+
+    elif cmd in ("number", "string"):
+        return ast
+
+    elif cmd == "variable":
+        node = scope.loads.get(ast[1])
+        if node is None:
+            addresses = scope.addresses(ast[1])
+            if len(addresses) == 1 and addresses[0][0] == 0:
+                node = ("load_local", ast[1], addresses[0][1])
+            else:
+                node = ("load_slot", ast[1], addresses)
+            scope.loads[ast[1]] = node
+        return node
+
+    elif cmd in ("add", "sub", "mult", "div", "eq", "ne", "lt", "gt", "le", "ge"):
+        return (cmd, _resolve(ast[1], scope), _resolve(ast[2], scope))
+
+    elif cmd == "if":
+        else_branch = _resolve(ast[3], scope) if ast[3] else None
+        return ("if", _resolve(ast[1], scope), _resolve(ast[2], scope), else_branch)
+
+    elif cmd == "while":
+        return ("while", _resolve(ast[1], scope), _resolve(ast[2], scope))
+
+    elif cmd == "function":
+        name, params, body = ast[1], ast[2], ast[3]
+        inner = Scope(params, parent=scope)
+        for local in _declarations(body[1], []):
+            inner.declare(local)
+        param_slots = tuple(inner.index[param] for param in params)
+        resolved_body = _resolve(body, inner)
+        return ("define_function", name, scope.index[name], params,
+                ("scope", tuple(inner.names), param_slots, resolved_body))
+
+    elif cmd == "call":
+        name, args = ast[1], ast[2]
+        addresses = scope.addresses(name)
+        if not addresses and name in BUILTINS:
+            return ("call_builtin", name, [_resolve(arg, scope) for arg in args])
+        return ("call_slot", name, addresses, [_resolve(arg, scope) for arg in args])
+
+    elif cmd == "array":
+        return ("array", [_resolve(element, scope) for element in ast[1]])
+
+    elif cmd == "index":
+        return ("index", _resolve(ast[1], scope), _resolve(ast[2], scope))
+
+    elif cmd == "store_index":
+        return ("store_index", _resolve(ast[1], scope), _resolve(ast[2], scope), _resolve(ast[3], scope))
+
+    else:
+        raise RuntimeError(f"Unknown AST node type: {cmd}")
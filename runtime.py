@@ -0,0 +1,93 @@
+"""
+Embedding API: compile a NotP program once, then run it many times.
+
+    program = Program.from_source("print(price * quantity)")
+    result = program.run({"price": 3, "quantity": 14})
+    result.output      # "42\\n"
+    result.variables   # {"price": 3, "quantity": 14}
+
+Each run gets fresh globals, seeded from the bindings, and a fresh output
+buffer. The bytecode is compiled and assembled once, in the constructor,
+and keeps its quickened instructions from one run to the next.
+"""
+
+from lexer import tokenize, tokenize_file
+from parser import Parser
+from compiler import UNSET, Compiler
+from arrays import Array
+from optimizer import optimize as optimize_bytecode
+from memoization import DEFAULT_MAXSIZE, MemoTable
+
+
+class Result:
+    """What one Program.run() produced."""
+    __slots__ = ("output", "variables")
+
+    def __init__(self, output, variables):
+        # Everything the program printed, one line per PRINT
+        self.output = output
+        # Global variables that hold a value at the end of the run
+        self.variables = variables
+
+    def __repr__(self):
+        return f"Result(output={self.output!r}, variables={self.variables!r})"
+
+
+class Program:
+    """A NotP program compiled for the VM, ready to run with different global bindings."""
+
+    def __init__(self, ast, optimize=False, memoize=False, memo_size=DEFAULT_MAXSIZE):
+        compiler = Compiler()
+        compiler.compile(ast)
+        if optimize:
+            optimize_bytecode(compiler)
+        compiler.assemble()
+        self.compiler = compiler
+        self.slots = {name: index for index, name in enumerate(compiler.names)}
+        # Pure functions never read globals, so their caches stay valid across runs.
+        self.memo = None
+        if memoize:
+            self.memo = MemoTable([code.name for code in compiler.functions_by_index if code and code.pure],
+                                  memo_size)
+
+    @classmethod
+    def from_source(cls, source, **options):
+        return cls(Parser(tokenize(source)).parse(), **options)
+
+    @classmethod
+    def from_file(cls, path, **options):
+        return cls(Parser(tokenize_file(path)).parse(), **options)
+
+    def initial_globals(self, bindings=None):
+        """
+        Returns a fresh global slot list holding 'bindings'. Names the program
+        never mentions are ignored, and Python lists and tuples become Arrays.
+        """
+        globals_vars = [UNSET] * len(self.slots)
+        if bindings:
+            slots = self.slots
+            for name, value in bindings.items():
+                index = slots.get(name)
+                if index is not None:
+                    globals_vars[index] = Array(value) if isinstance(value, (list, tuple)) else value
+        return globals_vars
+
+    def result(self, globals_vars, printed):
+        """Builds the Result of a finished run from its globals and PRINT values."""
+        output = "".join(f"{value}\n" for value in printed)
+        # Hidden variables of the compiler (hoisted loop limits) are not identifiers
+        variables = {name: globals_vars[index] for name, index in self.slots.items()
+                     if globals_vars[index] is not UNSET and name.isidentifier()}
+        return Result(output, variables)
+
+    def run(self, bindings=None, limits=None):
+        """
+        Runs the program with 'bindings' ({name: value}) as its initial globals
+        and returns a Result. Errors raised by the program propagate unchanged.
+        With limits.Limits, a run that exceeds them raises limits.LimitExceeded.
+        """
+        globals_vars = self.initial_globals(bindings)
+        printed = []
+        self.compiler.run(memo=self.memo, globals_vars=globals_vars, output=printed, limits=limits)
+        return self.result(globals_vars, printed)
+
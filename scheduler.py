@@ -0,0 +1,108 @@
+"""
+Cooperative scheduling of many NotP programs inside one process.
+
+A Task is one run of a runtime.Program on the VM. Its ip, value stack,
+call stack and current bytecode live in a suspended Compiler.execute()
+generator, which runs at most 'slice_size' instructions each time it is
+resumed. A Scheduler resumes its tasks in weighted round-robin order: a
+task of weight 3 gets three slices per round, a task of weight 1 gets one.
+A long 'while' loop therefore cannot starve other tasks.
+
+    scheduler = Scheduler()
+    for tenant, inputs in requests:
+        scheduler.spawn(programs[tenant], inputs, name=tenant)
+    for task in scheduler.run():
+        print(task.name, task.error or task.result.output)
+
+Scheduler.run_async() does the same from an asyncio event loop and yields
+to it after every task's turn.
+
+With limits.Limits, every task is metered: a task that exceeds them ends
+with a LimitExceeded error while the others go on. Metered slices are
+counted in steps (jumps, calls and returns) rather than instructions.
+"""
+
+import asyncio
+from collections import deque
+
+DEFAULT_SLICE = 1000
+
+
+class Task:
+    """One suspended or finished run of a Program."""
+    __slots__ = ("name", "weight", "program", "globals_vars", "printed", "execution",
+                 "slices", "done", "result", "error")
+
+    def __init__(self, program, bindings=None, slice_size=DEFAULT_SLICE, weight=1, name=None, limits=None):
+        self.name = name
+        self.weight = weight
+        self.program = program
+        self.globals_vars = program.initial_globals(bindings)
+        self.printed = []
+        self.execution = program.compiler.execute(memo=program.memo, globals_vars=self.globals_vars,
+                                                  output=self.printed, slice_size=slice_size, limits=limits)
+        # Slices run so far
+        self.slices = 0
+        self.done = False
+        # runtime.Result once the task finished normally
+        self.result = None
+        # The exception that ended the task, if any
+        self.error = None
+
+    def step(self):
+        """Runs one slice. Returns True once the task has finished, normally or with an error."""
+        if self.done:
+            return True
+        self.slices += 1
+        try:
+            next(self.execution)
+            return False
+        except StopIteration:
+            self.result = self.program.result(self.globals_vars, self.printed)
+        except Exception as error:
+            self.error = error
+        self.done = True
+        self.execution = None
+        return True
+
+
+class Scheduler:
+    """Weighted round-robin over Tasks."""
+
+    def __init__(self, slice_size=DEFAULT_SLICE, limits=None):
+        self.slice_size = slice_size
+        # limits.Limits applied to every task
+        self.limits = limits
+        self.ready = deque()
+
+    def spawn(self, program, bindings=None, weight=1, name=None):
+        """Creates a Task for 'program' and queues it; returns the Task."""
+        task = Task(program, bindings, self.slice_size, weight, name, self.limits)
+        self.ready.append(task)
+        return task
+
+    def _turn(self):
+        """Gives the next ready task up to 'weight' slices. Returns it if it finished, else None."""
+        task = self.ready.popleft()
+        for _ in range(task.weight):
+            if task.step():
+                return task
+        self.ready.append(task)
+        return None
+
+    def run(self):
+        """Runs until no task is left, yielding each task as it finishes."""
+        while self.ready:
+            task = self._turn()
+            if task is not None:
+                yield task
+
+    async def run_async(self):
+        """Like run(), but returns the finished tasks and lets the event loop run between turns."""
+        finished = []
+        while self.ready:
+            task = self._turn()
+            if task is not None:
+                finished.append(task)
+            await asyncio.sleep(0)
+        return finished
@@ -0,0 +1,363 @@
+"""
+Tree-walking interpreter that keeps its own control and value stacks.
+
+interpret() recurses in Python for every node and every NotP call, and
+delivers 'return' by raising ReturnSignal. This interpreter instead pushes
+nodes and continuation markers onto a 'todo' list and runs them in a
+single loop. Recursion depth is limited only by max_depth, and a
+'return' truncates the todo list back to the height saved by its call.
+
+Only NotP calls can nest without bound, so only the nodes that contain a
+call or a 'return' go through the todo list. Any other statement or
+expression is run by interpret() in one step; its Python recursion is
+bounded by how deeply the source nests, not by how deeply calls do.
+
+It accepts the same ASTs as interpret(), including resolver output.
+"""
+
+import operator
+
+from arrays import Array
+from interpreter import UNSET, Environment, SlotEnvironment, interpret
+from stdlib import BUILTINS
+
+DEFAULT_MAX_DEPTH = 100000
+
+BINARY_OPERATORS = {
+    "add": operator.add, "sub": operator.sub, "mult": operator.mul, "div": operator.floordiv,
+    "eq": operator.eq, "ne": operator.ne, "lt": operator.lt, "gt": operator.gt,
+    "le": operator.le, "ge": operator.ge,
+}
+
+STATEMENTS = frozenset((
+    "line", "block", "if", "while", "assign", "store_slot", "store_index", "print",
+    "expression_statement", "return", "function", "define_function",
+))
+
+# Continuation markers. They share the todo list with AST nodes, so they
+# use tags that can never be an AST node kind.
+K_BINARY = "<binary>"
+K_STORE_SLOT = "<store_slot>"
+K_DEFINE = "<define>"
+K_PRINT = "<print>"
+K_POP = "<pop>"
+K_IF = "<if>"
+K_WHILE = "<while>"
+K_CALL = "<call>"
+K_RETURN = "<return>"
+K_END_CALL = "<end_call>"
+K_ARRAY = "<array>"
+K_INDEX = "<index>"
+K_STORE_INDEX = "<store_index>"
+K_BUILTIN = "<builtin>"
+
+
+class StackDepthError(RuntimeError):
+    """Raised when NotP calls nest deeper than the configured max_depth."""
+
+
+def _children(node):
+    if node[0] == "scope":
+        return (node[3],)
+    children = []
+    for item in node[1:]:
+        if type(item) is tuple and item and type(item[0]) is str:
+            children.append(item)
+        elif type(item) is list:
+            children.extend(child for child in item if type(child) is tuple and child and type(child[0]) is str)
+    return children
+
+
+def stacked_nodes(statements):
+    """
+    Maps the id of each node that contains a NotP call or a 'return',
+    including those inside function bodies, to the node's kind. A function definition itself
+    does not count: defining a function runs none of its body.
+    """
+    verdicts = {}
+    kinds = {}
+
+    def visit(node):
+        verdict = verdicts.get(id(node))
+        if verdict is None:
+            # Shared leaves are visited once
+            verdict = False
+            for child in _children(node):
+                if visit(child):
+                    verdict = True
+            kind = node[0]
+            if kind in ("function", "define_function"):
+                verdict = False
+            elif kind in ("call", "call_slot", "return"):
+                verdict = True
+            verdicts[id(node)] = verdict
+            if verdict:
+                kinds[id(node)] = kind
+        return verdict
+
+    for statement in statements:
+        visit(statement)
+    return kinds
+
+
+def run(ast, env=None, max_depth=DEFAULT_MAX_DEPTH):
+    """Executes a 'program' or 'resolved_program' AST without Python recursion."""
+    if env is None:
+        env = SlotEnvironment(len(ast[1])) if ast[0] == "resolved_program" else Environment()
+
+    statements = ast[2] if ast[0] == "resolved_program" else ast[1]
+    stacked = stacked_nodes(statements)
+    todo = list(reversed(statements))
+    append = todo.append
+    values = []
+    push = values.append
+    pop = values.pop
+    # One entry per active call: (todo height to unwind to, caller's env)
+    frames = []
+    # Call node id -> positions of its first and last argument that contain a call
+    call_spans = {}
+
+    # Expanding a node that contains a call: its operands go on the todo
+    # list first, then a continuation that combines their values. Operands
+    # without calls never need the todo list: those before the first call
+    # are evaluated on the spot, and those after the last call by the
+    # continuation.
+
+    def binary(node):
+        left, right = node[1], node[2]
+        if id(left) not in stacked:
+            push(interpret(left, env))
+            append((K_BINARY, BINARY_OPERATORS[node[0]], None))
+            append(right)
+        elif id(right) in stacked:
+            append((K_BINARY, BINARY_OPERATORS[node[0]], None))
+            append(right)
+            append(left)
+        else:
+            append((K_BINARY, BINARY_OPERATORS[node[0]], right))
+            append(left)
+
+    def store_slot(node):
+        append((K_STORE_SLOT, node[2]))
+        append(node[3])
+
+    def assign(node):
+        append((K_DEFINE, node[1]))
+        append(node[2])
+
+    def block(node):
+        for statement in reversed(node[1]):
+            append(statement[2] if statement[0] == "line" else statement)
+
+    def line(node):
+        append(node[2])
+
+    def if_(node):
+        if id(node[1]) in stacked:
+            append((K_IF, node[2], node[3]))
+            append(node[1])
+        elif interpret(node[1], env):
+            append(node[2])
+        elif node[3]:
+            append(node[3])
+
+    def while_(node):
+        if id(node[1]) in stacked:
+            append((K_WHILE, node))
+            append(node[1])
+        elif interpret(node[1], env):
+            # Back to this node once the body has run
+            append(node)
+            append(node[2])
+
+    def call(node):
+        name = node[1]
+        arg_nodes = node[2] if node[0] == "call" else node[3]
+        try:
+            callee = env.lookup(name) if node[0] == "call" else env.load(node[2], name)
+        except NameError:
+            # A builtin stays callable until the program's own definition has run
+            if name not in BUILTINS:
+                raise
+            call_builtin(("call_builtin", name, arg_nodes))
+            return
+        if not isinstance(callee, tuple) or callee[0] != "function":
+            raise TypeError(f"'{name}' is not a function.")
+        spans = call_spans.get(id(node))
+        if spans is None:
+            positions = [position for position, arg in enumerate(arg_nodes) if id(arg) in stacked]
+            spans = call_spans[id(node)] = (positions[0], positions[-1]) if positions else (None, None)
+        first, last = spans
+        if first is None:
+            enter(name, callee, [interpret(arg, env) for arg in arg_nodes])
+            return
+        for arg in arg_nodes[:first]:
+            push(interpret(arg, env))
+        append((K_CALL, name, callee, len(arg_nodes), arg_nodes[last + 1:]))
+        todo.extend(reversed(arg_nodes[first:last + 1]))
+
+    def return_(node):
+        if id(node[1]) in stacked:
+            append((K_RETURN,))
+            append(node[1])
+        else:
+            value = interpret(node[1], env)
+            k_return(node)
+            push(value)
+
+    def call_builtin(node):
+        append((K_BUILTIN, BUILTINS[node[1]], len(node[2])))
+        todo.extend(reversed(node[2]))
+
+    def array(node):
+        append((K_ARRAY, len(node[1])))
+        todo.extend(reversed(node[1]))
+
+    def index(node):
+        append((K_INDEX,))
+        append(node[2])
+        append(node[1])
+
+    def store_index(node):
+        append((K_STORE_INDEX,))
+        append(node[3])
+        append(node[2])
+        append(node[1])
+
+    def print_(node):
+        append((K_PRINT,))
+        append(node[1])
+
+    def expression_statement(node):
+        append((K_POP,))
+        append(node[1])
+
+    # Continuations
+
+    def k_binary(node):
+        b = pop() if node[2] is None else interpret(node[2], env)
+        values[-1] = node[1](values[-1], b)
+
+    def k_store_slot(node):
+        env.slots[node[1]] = pop()
+
+    def k_define(node):
+        env.define(node[1], pop())
+
+    def k_if(node):
+        if pop():
+            append(node[1])
+        elif node[2]:
+            append(node[2])
+
+    def k_while(node):
+        if pop():
+            append(node)
+            append(node[1][1])
+            append(node[1][2])
+
+    def k_call(node):
+        for arg in node[4]:
+            push(interpret(arg, env))
+        num_args = node[3]
+        args = values[len(values) - num_args:]
+        del values[len(values) - num_args:]
+        enter(node[1], node[2], args)
+
+    def enter(name, callee, args):
+        nonlocal env
+        _, params, body, definition_env = callee
+        if len(params) != len(args):
+            raise TypeError(f"Function '{name}' expects {len(params)} arguments, but got {len(args)}.")
+
+        if body[0] == "scope":
+            _, local_names, param_slots, body = body
+            call_env = SlotEnvironment(len(local_names), parent=definition_env)
+            for slot, arg_value in zip(param_slots, args):
+                call_env.slots[slot] = arg_value
+        else:
+            call_env = Environment(parent=definition_env)
+            for param_name, arg_value in zip(params, args):
+                call_env.define(param_name, arg_value)
+
+        if todo and todo[-1][0] == K_RETURN and frames:
+            # Tail call: drop the returning frame and let the callee return to its caller
+            height, env = frames.pop()
+            del todo[height:]
+        if len(frames) >= max_depth:
+            raise StackDepthError(f"Maximum call depth of {max_depth} exceeded in '{name}'.")
+        frames.append((len(todo), env))
+        env = call_env
+        append((K_END_CALL,))
+        if id(body) in stacked:
+            expand[body[0]](body)
+        else:
+            append(body)
+
+    def k_return(node):
+        nonlocal env
+        if not frames:
+            raise RuntimeError("'return' outside of a function.")
+        height, env = frames.pop()
+        del todo[height:]
+
+    def k_end_call(node):
+        nonlocal env
+        # The body finished without a 'return'
+        _, env = frames.pop()
+        push(None)
+
+    def k_builtin(node):
+        num_args = node[2]
+        args = values[len(values) - num_args:]
+        del values[len(values) - num_args:]
+        push(node[1](*args))
+
+    def k_array(node):
+        count = node[1]
+        elements = values[len(values) - count:]
+        del values[len(values) - count:]
+        push(Array(elements))
+
+    def k_index(node):
+        index = pop()
+        values[-1] = values[-1][index]
+
+    def k_store_index(node):
+        value = pop()
+        index = pop()
+        pop()[index] = value
+
+    def k_print(node):
+        print(pop())
+
+    def k_pop(node):
+        pop()
+
+    expand = dict.fromkeys(BINARY_OPERATORS, binary)
+    expand.update({
+        "store_slot": store_slot, "assign": assign, "block": block, "line": line, "if": if_,
+        "while": while_, "call": call, "call_slot": call, "return": return_,
+        "call_builtin": call_builtin, "array": array, "index": index, "store_index": store_index,
+        "print": print_, "expression_statement": expression_statement,
+    })
+    resume = {
+        K_BINARY: k_binary, K_STORE_SLOT: k_store_slot, K_DEFINE: k_define, K_IF: k_if,
+        K_WHILE: k_while, K_CALL: k_call, K_RETURN: k_return, K_END_CALL: k_end_call,
+        K_BUILTIN: k_builtin, K_ARRAY: k_array, K_INDEX: k_index, K_STORE_INDEX: k_store_index,
+        K_PRINT: k_print, K_POP: k_pop,
+    }
+
+    # Node id -> its expand handler, for the nodes that contain a call or a 'return'
+    handlers = {node_id: expand[kind] for node_id, kind in stacked.items() if kind in expand}
+
+    while todo:
+        node = todo.pop()
+        kind = node[0]
+        handler = resume.get(kind) or handlers.get(id(node))
+        if handler is not None:
+            handler(node)
+        elif kind in STATEMENTS:
+            interpret(node, env)
+        else:
+            push(interpret(node, env))
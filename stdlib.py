@@ -0,0 +1,72 @@
+"""
+Builtin functions: host Python functions that NotP programs call by name.
+
+BUILTINS is the registry that every engine uses. A call to a name the program
+does not define as a function is looked up here. The resolver turns such
+a call into a "call_builtin" node, and Compiler emits CALL_BUILTIN for
+it. Either way, the host function is called directly, with no NotP frame.
+A program's own function of the same name replaces a builtin only once
+its definition has run, in every engine.
+
+Embedding hosts add their own builtins with register():
+
+    import stdlib
+
+    @stdlib.register("clamp")
+    def clamp(value, low, high):
+        return max(low, min(value, high))
+
+Register builtins before compiling the programs that call them. The
+compiler decides at compile time whether a call is a builtin call.
+"""
+
+from arrays import fill, largest, length, smallest, total
+
+
+def absolute(value):
+    """abs(x): the absolute value of an integer."""
+    return abs(value)
+
+
+def modulo(dividend, divisor):
+    """mod(a, b): the remainder of a / b, with the sign of b (so it matches '/', which rounds down)."""
+    return dividend % divisor
+
+
+def parse_int(text):
+    """int(s): the integer written in the string s. An integer is returned unchanged."""
+    if type(text) is int:
+        return text
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        raise ValueError(f"int() cannot parse {text!r}") from None
+
+
+def to_string(value):
+    """str(x): x as it would be printed."""
+    return str(value)
+
+
+BUILTINS = {
+    "len": length, "sum": total, "min": smallest, "max": largest, "fill": fill,
+    "abs": absolute, "mod": modulo, "int": parse_int, "str": to_string,
+}
+
+
+def register(name, function=None):
+    """
+    Makes 'function' callable from NotP as 'name' and returns it. Without a
+    function, returns a decorator that registers the decorated one.
+    """
+    if function is None:
+        return lambda function: register(name, function)
+    if not name.isidentifier():
+        raise ValueError(f"'{name}' is not a valid NotP name")
+    BUILTINS[name] = function
+    return function
+
+
+def unregister(name):
+    """Removes a builtin; unknown names are ignored."""
+    BUILTINS.pop(name, None)
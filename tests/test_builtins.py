@@ -0,0 +1,91 @@
+"""
+Every engine must agree on when a program's own function replaces a builtin
+of the same name: only once its definition has run. They must also agree
+that fill() never shares an array between elements.
+
+    python -m pytest tests
+"""
+
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexer import tokenize
+from parser import Parser
+from compiler import Compiler
+from interpreter import interpret
+from resolver import resolve
+from closure_compiler import compile_closures
+from optimizer import optimize
+from jit import Jit
+import stack_interpreter
+
+
+def run_vm(ast, optimized=False, jit=None):
+    compiler = Compiler()
+    compiler.compile(ast)
+    if optimized:
+        optimize(compiler)
+    compiler.assemble()
+    compiler.run(jit=jit)
+
+
+ENGINES = {
+    "interpreter": lambda ast: interpret(resolve(ast)),
+    "unresolved": interpret,
+    "stack": lambda ast: stack_interpreter.run(resolve(ast)),
+    "closures": lambda ast: compile_closures(ast)(),
+    "vm": run_vm,
+    "vm-O": lambda ast: run_vm(ast, optimized=True),
+    "vm-jit": lambda ast: run_vm(ast, jit=Jit(1)),
+}
+
+SHADOWED_LATER = """
+a = [1, 2]
+print(len(a))
+func len(x) { return 99 }
+print(len(a))
+"""
+
+SHADOWED_IN_FUNCTION = """
+func f(a) { return len(a) }
+print(f([1, 2, 3]))
+func len(x) { if (x < 1) { return 0 } return len(x - 1) + 1 }
+print(len(5))
+print(f(4))
+"""
+
+NESTED_FILL = """
+a = fill(2, fill(2, fill(2, 0)))
+a[0][0][0] = 5
+a[1][1] = fill(1, "x")
+print(a)
+"""
+
+
+def output(engine, source):
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        ENGINES[engine](Parser(tokenize(source)).parse())
+    return buffer.getvalue().split()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_builtin_until_definition_runs(engine):
+    assert output(engine, SHADOWED_LATER) == ["2", "99"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_shadowed_builtin_called_from_function(engine):
+    assert output(engine, SHADOWED_IN_FUNCTION) == ["3", "5", "4"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_nested_fill_shares_nothing(engine):
+    assert " ".join(output(engine, NESTED_FILL)) == "[[[5, 0], [0, 0]], [[0, 0], [x]]]"
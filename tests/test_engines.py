@@ -0,0 +1,115 @@
+"""
+Every engine and VM mode must print what the tree interpreter prints for
+each program in examples/ and benchmarks/.
+
+    python -m pytest tests
+"""
+
+import contextlib
+import functools
+import glob
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexer import tokenize_file
+from parser import Parser
+from compiler import Compiler
+import interpreter
+from resolver import resolve
+from closure_compiler import compile_closures
+from optimizer import optimize
+from memoization import MemoTable, find_pure_functions
+from jit import Jit
+import bytecode_cache
+import native_compiler
+import stack_interpreter
+
+PROGRAMS = sorted(glob.glob(os.path.join(ROOT, "examples", "*.notp"))
+                  + glob.glob(os.path.join(ROOT, "benchmarks", "*.notp")))
+
+
+def compile_vm(ast, optimized=False):
+    compiler = Compiler()
+    compiler.compile(ast)
+    if optimized:
+        optimize(compiler)
+    compiler.assemble()
+    return compiler
+
+
+def run_memoized_interpreter(ast, path):
+    interpreter.memo = MemoTable(find_pure_functions(ast))
+    try:
+        interpreter.interpret(resolve(ast))
+    finally:
+        interpreter.memo = None
+
+
+def run_memoized_vm(ast, path):
+    compiler = compile_vm(ast)
+    compiler.run(memo=MemoTable([code.name for code in compiler.functions_by_index if code and code.pure]))
+
+
+def run_cached_vm(ast, path, optimized=False):
+    """Runs the program from a .notpc file written by a first compile, as a cache hit would."""
+    digest = bytecode_cache.source_hash(path)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache_path = bytecode_cache.cache_path(path, cache_dir, optimized)
+        bytecode_cache.store(compile_vm(ast, optimized), cache_path, digest, optimized)
+        compiler = bytecode_cache.load(cache_path, digest, optimized)
+    assert compiler is not None
+    compiler.run()
+
+
+def run_native(ast, path):
+    if shutil.which("gcc") is None:
+        pytest.skip("no C compiler")
+    try:
+        assembly = native_compiler.compile_native(ast)
+    except native_compiler.Unsupported as reason:
+        pytest.skip(f"not supported by the native backend: {reason}")
+    with tempfile.TemporaryDirectory() as directory:
+        binary = os.path.join(directory, "program")
+        native_compiler.build(assembly, binary)
+        print(subprocess.run([binary], capture_output=True, text=True, check=True).stdout, end="")
+
+
+ENGINES = {
+    "stack": lambda ast, path: stack_interpreter.run(resolve(ast)),
+    "closures": lambda ast, path: compile_closures(ast)(),
+    "native": run_native,
+    "vm": lambda ast, path: compile_vm(ast).run(),
+    "vm-O": lambda ast, path: compile_vm(ast, optimized=True).run(),
+    "vm-jit": lambda ast, path: compile_vm(ast).run(jit=Jit(1)),
+    "vm-cached": run_cached_vm,
+    "vm-O-cached": functools.partial(run_cached_vm, optimized=True),
+    "interpreter-memoize": run_memoized_interpreter,
+    "vm-memoize": run_memoized_vm,
+}
+
+
+def output(run, path):
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        run(Parser(tokenize_file(path)).parse(), path)
+    return buffer.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def expected(path):
+    return output(lambda ast, path: interpreter.interpret(resolve(ast)), path)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("path", PROGRAMS, ids=lambda path: os.path.relpath(path, ROOT))
+def test_engine_matches_interpreter(path, engine):
+    assert output(ENGINES[engine], path) == expected(path)
@@ -0,0 +1,75 @@
+"""
+Metered runs must end in LimitExceeded, never in a raw Python error.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexer import tokenize
+from parser import Parser
+from interpreter import metered
+from resolver import resolve
+from limits import LimitExceeded, Limits
+from runtime import Program
+
+DEEP = """
+func r(n) { if (n < 1) { return 0 } return r(n - 1) + 1 }
+print(r(100000))
+"""
+
+
+def run_interpreter(source, limits):
+    return metered(resolve(Parser(tokenize(source)).parse()), limits)
+
+
+@pytest.mark.parametrize("max_depth", [sys.getrecursionlimit() * 2, None])
+def test_interpreter_depth_above_python_limit(max_depth):
+    with pytest.raises(LimitExceeded) as error:
+        run_interpreter(DEEP, Limits(max_depth=max_depth))
+    assert error.value.limit == "depth"
+    assert error.value.maximum < sys.getrecursionlimit()
+
+
+def test_interpreter_depth_below_python_limit():
+    with pytest.raises(LimitExceeded) as error:
+        run_interpreter(DEEP, Limits(max_depth=50))
+    assert (error.value.limit, error.value.maximum) == ("depth", 50)
+
+
+def test_vm_depth():
+    with pytest.raises(LimitExceeded) as error:
+        Program.from_source(DEEP).run(limits=Limits(max_depth=sys.getrecursionlimit() * 2))
+    assert (error.value.limit, error.value.maximum) == ("depth", sys.getrecursionlimit() * 2)
+
+
+NESTED_FILL = "a = fill(100, fill(100, fill(100, 0)))"
+
+
+def test_nested_fill_counts_every_level():
+    # 100 * 100 * 100 elements of 8 bytes each
+    limits = Limits(max_value_size=10 ** 6)
+    for run in (run_interpreter, lambda source, limits: Program.from_source(source).run(limits=limits)):
+        with pytest.raises(LimitExceeded) as error:
+            run(NESTED_FILL, limits)
+        assert error.value.limit == "value size"
+
+
+@pytest.mark.parametrize("source", [
+    # 100 strings of 2000 characters
+    'a = fill(100, "ab") * 1000',
+    # Every squaring doubles each element's size
+    "a = fill(1000, 3)\ni = 0\nwhile (i < 40) { a = a * a\ni = i + 1 }",
+])
+def test_elementwise_product_checked_before_it_is_built(source):
+    limits = Limits(max_value_size=10 ** 5)
+    for run in (run_interpreter, lambda source, limits: Program.from_source(source).run(limits=limits)):
+        with pytest.raises(LimitExceeded) as error:
+            run(source, limits)
+        assert error.value.limit == "value size"
@@ -0,0 +1,80 @@
+"""
+Memoized calls must return what an uncached call would, and the LRU caches
+must evict and count the way MemoTable.report() describes.
+
+    python -m pytest tests
+"""
+
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexer import tokenize
+from parser import Parser
+import interpreter
+from memoization import MISSING, LRUCache, MemoTable, find_pure_functions
+from resolver import resolve
+from runtime import Program
+
+BOOLS_AND_INTS = """
+func same(x) { return x }
+print(same(1))
+print(same(1 < 2))
+print(same(0))
+print(same(2 < 1))
+print(same(1))
+"""
+
+
+def run_interpreter(source):
+    ast = Parser(tokenize(source)).parse()
+    memo = MemoTable(find_pure_functions(ast))
+    buffer = io.StringIO()
+    interpreter.memo = memo
+    try:
+        with contextlib.redirect_stdout(buffer):
+            interpreter.interpret(resolve(ast))
+    finally:
+        interpreter.memo = None
+    return buffer.getvalue().split(), memo
+
+
+def run_vm(source):
+    program = Program.from_source(source, memoize=True)
+    return program.run().output.split(), program.memo
+
+
+@pytest.mark.parametrize("run", [run_interpreter, run_vm], ids=["interpreter", "vm"])
+def test_bools_and_ints_cached_apart(run):
+    output, memo = run(BOOLS_AND_INTS)
+    assert output == ["1", "True", "0", "False", "1"]
+    assert memo.stats()["same"] == (1, 4, 4)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert list(cache.data) == ["a", "c"]
+
+
+def test_lru_counts_hits_and_misses():
+    cache = LRUCache(maxsize=1)
+    assert cache.get("a") is MISSING
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("a") == 1
+    cache.put("b", 2)
+    assert cache.get("a") is MISSING
+    assert (cache.hits, cache.misses, len(cache.data)) == (2, 2, 1)